@@ -1,6 +1,7 @@
 # app.py
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
 import uuid
 
@@ -10,7 +11,7 @@ from supabase_client import (
     leave_user_club
 )
 
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse)
 
 # 🔥 개발용 CORS (나중에 도메인 제한 가능)
 app.add_middleware(
@@ -33,6 +33,7 @@ from supabase import create_client
 
 # fast api 로드... (추후 API 서버로 확장 시 사용)
 from fastapi import FastAPI, Header, HTTPException
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
 import uvicorn
 
@@ -44,7 +45,7 @@ load_dotenv()
 API_KEY = os.getenv("API_KEY")
 
 load_dotenv()
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse)
 
 # =========================
 # Supabase 연결
@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import functools
+import json
+import sys
+import urllib.request
+import time
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / "benefit_service"))
+
+from bench.fake_postgrest import FakePostgrest
+from catalog import afetch_rows
+from shared.clients import close_async_supabase, get_async_supabase, start_async_supabase
+
+DUMMY_KEY = "eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9.e30.bench"
+DOMAINS = ["beauty", "food", "entertainment", "commerce", "general"]
+CHANNELS = ["mobile", "online", "offline"]
+
+
+def synthetic_catalog(n: int) -> List[Dict[str, Any]]:
+    return [
+        {
+            "id": i,
+            "brand": f"brand-{i % 500}",
+            "brand_code": f"B{i % 500:04d}",
+            "title": f"benefit {i} " + "x" * (i % 40),
+            "type": "coupon" if i % 3 else "point",
+            "channel": CHANNELS[i % len(CHANNELS)],
+            "domain": DOMAINS[i % len(DOMAINS)],
+            "discount_rate": (i % 50) / 100,
+            "url": f"https://example.com/benefit/{i}",
+        }
+        for i in range(1, n + 1)
+    ]
+
+
+def _requests(url: str) -> int:
+    with urllib.request.urlopen(f"{url}/__stats") as resp:
+        return json.loads(resp.read())[0]["requests"]
+
+
+async def _timed(fn: Callable[[], Awaitable[List[Dict[str, Any]]]]) -> tuple:
+    start = time.perf_counter()
+    rows = await fn()
+    return time.perf_counter() - start, len(rows)
+
+
+async def _unbounded(sb: Any) -> List[Dict[str, Any]]:
+    return (await sb.table("benefit_labeled").select("*").execute()).data
+
+
+async def _run_size(url: str, n: int, *, page_size: int) -> None:
+    # Same client and pooled transport the service uses.
+    await start_async_supabase()
+    try:
+        sb = await get_async_supabase(url, DUMMY_KEY)
+        strategies = {"unbounded select": lambda: _unbounded(sb)}
+        for workers in (1, 4, 8):
+            strategies[f"keyset x{workers}"] = functools.partial(
+                afetch_rows, sb, "benefit_labeled", page_size=page_size, workers=workers
+            )
+        for name, fn in strategies.items():
+            before = _requests(url)
+            sec, fetched = await _timed(fn)
+            issued = _requests(url) - before - 1
+            print(f"{n:>8} {name:<18} {sec:>8.3f} {fetched:>8} {issued:>9}")
+    finally:
+        await close_async_supabase()
+
+
+def run(sizes: List[int], *, page_size: int, max_rows: int, latency_ms: float) -> None:
+    print(f"page_size={page_size} max_rows={max_rows} latency={latency_ms}ms")
+    print(f"{'rows':>8} {'strategy':<18} {'sec':>8} {'fetched':>8} {'requests':>9}")
+    for n in sizes:
+        fake = FakePostgrest(
+            {"benefit_labeled": synthetic_catalog(n)},
+            max_rows=max_rows,
+            latency_sec=latency_ms / 1000,
+        )
+        proc, url = fake.serve_in_process()
+        try:
+            asyncio.run(_run_size(url, n, page_size=page_size))
+        finally:
+            proc.terminate()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark benefit_labeled catalog fetching")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--page-size", type=int, default=1000)
+    parser.add_argument("--max-rows", type=int, default=1000)
+    parser.add_argument("--latency-ms", type=float, default=40.0)
+    args = parser.parse_args()
+    run(args.sizes, page_size=args.page_size, max_rows=args.max_rows, latency_ms=args.latency_ms)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+
+import orjson
+from postgrest.exceptions import APIError
+from supabase import Client, create_client
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / "benefit_service"))
+
+from catalog import _page_query
+from shared import queries
+from shared.cold_start import SEGMENT_DEFAULTS_TABLE
+
+# Plans come from PostgREST (Accept: application/vnd.pgrst.plan+json), so each
+# query is planned exactly as the services send it. The local stack has plan
+# output disabled by default.
+ENABLE_PLANS_SQL = (
+    "alter role authenticator set pgrst.db_plan_enabled to 'true'; "
+    "notify pgrst, 'reload config';"
+)
+# Loading every segment default in one request is intended.
+DEFAULT_ALLOW = (SEGMENT_DEFAULTS_TABLE,)
+PAGE_SIZE = 1000
+
+Query = Tuple[str, Callable[[], Any]]
+
+
+def service_queries(sb: Client, user_id: str, day: str) -> List[Query]:
+    since = datetime.now(tz=timezone.utc) - timedelta(days=30)
+    return [
+        ("feature.latest", lambda: queries.latest_feature(sb, user_id)),
+        (
+            "catalog.page",
+            lambda: _page_query(
+                sb, "benefit_labeled", "id", after=0, lo=None, hi=None, page_size=PAGE_SIZE
+            ),
+        ),
+        ("segment_defaults.all", lambda: sb.table(SEGMENT_DEFAULTS_TABLE).select("*")),
+        ("pool.row", lambda: queries.pool_row(sb, user_id, day)),
+        (
+            "pool.completed",
+            lambda: queries.completed_missions(sb, [user_id], since).range(0, PAGE_SIZE - 1),
+        ),
+        ("exclusion.summary", lambda: queries.exclusion_summary(sb, user_id)),
+        (
+            "ingest.pool_rows",
+            lambda: queries.pool_rows(sb, [user_id], [day]).range(0, PAGE_SIZE - 1),
+        ),
+        (
+            "ingest.exclusions",
+            lambda: queries.exclusion_summaries(sb, [user_id]).range(0, PAGE_SIZE - 1),
+        ),
+        ("recompute.previous", lambda: queries.previous_snapshot(sb, day)),
+        (
+            "recompute.snapshot",
+            lambda: queries.keyset_page(
+                sb,
+                "user_feature_30d",
+                "user_id",
+                after=user_id,
+                page_size=PAGE_SIZE,
+                snapshot_date=day,
+            ),
+        ),
+        (
+            "recompute.clubs",
+            lambda: queries.keyset_page(
+                sb,
+                "user_selected_club",
+                "user_id,club_domain,status",
+                after=user_id,
+                page_size=PAGE_SIZE,
+            ),
+        ),
+        (
+            "recompute.exclusions",
+            lambda: queries.keyset_page(
+                sb,
+                queries.EXCLUSION_TABLE,
+                "user_id,exclusions",
+                after=user_id,
+                page_size=PAGE_SIZE,
+            ),
+        ),
+    ]
+
+
+def _nodes(plan: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    yield plan
+    for child in plan.get("Plans") or []:
+        yield from _nodes(child)
+
+
+def seq_scans(plan: Dict[str, Any]) -> List[str]:
+    return [
+        node.get("Relation Name") or "?"
+        for node in _nodes(plan)
+        if node.get("Node Type") == "Seq Scan"
+    ]
+
+
+def explain(builder: Any) -> Dict[str, Any]:
+    return builder.explain(format="json").execute().data[0]["Plan"]
+
+
+def _sample_user(sb: Client) -> str:
+    rows = sb.table("user_feature_30d").select("user_id").limit(1).execute().data or []
+    return str(rows[0]["user_id"]) if rows else "U000001"
+
+
+def run(sb: Client, *, user_id: str, day: str, allow: List[str], show_plans: bool) -> int:
+    print(f"user_id={user_id} date={day}")
+    print(f"{'query':<24} {'cost':>10} {'rows':>8}  seq scans")
+    flagged = 0
+    for name, build in service_queries(sb, user_id, day):
+        try:
+            plan = explain(build())
+        except APIError as e:
+            print(f"{name:<24} error: {e.message}")
+            flagged += 1
+            continue
+        scans = seq_scans(plan)
+        bad = [rel for rel in scans if rel not in allow]
+        flagged += bool(bad)
+        mark = ", ".join(f"{rel}{'' if rel in allow else ' !'}" for rel in scans) or "-"
+        print(
+            f"{name:<24} {plan.get('Total Cost', 0):>10.2f} {plan.get('Plan Rows', 0):>8}  {mark}"
+        )
+        if show_plans:
+            print(orjson.dumps(plan, option=orjson.OPT_INDENT_2).decode())
+    return flagged
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="EXPLAIN the services' Supabase queries against a local stack and flag seq scans"
+    )
+    parser.add_argument("--url", default=os.getenv("SUPABASE_URL", "http://127.0.0.1:54321"))
+    parser.add_argument("--key", default=os.getenv("SUPABASE_SERVICE_KEY"))
+    parser.add_argument("--user-id", help="defaults to the first user in user_feature_30d")
+    parser.add_argument("--date", default=date.today().isoformat())
+    parser.add_argument(
+        "--allow", nargs="*", default=list(DEFAULT_ALLOW), help="tables allowed to seq scan"
+    )
+    parser.add_argument("--plans", action="store_true", help="print every plan as JSON")
+    args = parser.parse_args()
+    if not args.key:
+        parser.error("--key or SUPABASE_SERVICE_KEY is required")
+
+    sb = create_client(args.url, args.key)
+    try:
+        user_id = args.user_id or _sample_user(sb)
+        explain(queries.latest_feature(sb, user_id))
+    except APIError as e:
+        print(f"PostgREST refused the plan request ({e.message}). Enable plans with:")
+        print(f"  {ENABLE_PLANS_SQL}")
+        sys.exit(2)
+
+    flagged = run(sb, user_id=user_id, day=args.date, allow=args.allow, show_plans=args.plans)
+    # The planner prefers seq scans on near-empty tables; load a representative
+    # snapshot before trusting a clean run.
+    if flagged:
+        print(
+            f"{flagged} queries scan tables sequentially; see lovaable_mycjone/supabase/migrations"
+        )
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+from __future__ import annotations
+
+import bisect
+import multiprocessing
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+import orjson
+
+Row = Dict[str, Any]
+RESERVED_PARAMS = {"select", "order", "limit", "offset", "on_conflict", "columns"}
+RANGE_OPS = {"gt", "gte", "lt", "lte"}
+
+
+def _coerce(raw: str, like: Any) -> Any:
+    if isinstance(like, bool):
+        return raw == "true"
+    if isinstance(like, int):
+        return int(raw)
+    if isinstance(like, float):
+        return float(raw)
+    return raw
+
+
+def _matches(row: Row, column: str, expr: str) -> bool:
+    op, _, raw = expr.partition(".")
+    value = row.get(column)
+    if raw == "null" and op == "is":
+        return value is None
+    if value is None:
+        return False
+    if op == "in":
+        options = raw.strip("()").split(",")
+        return str(value) in options
+    target = _coerce(raw, value)
+    if op == "eq":
+        return value == target
+    if op == "neq":
+        return value != target
+    if op == "gt":
+        return value > target
+    if op == "gte":
+        return value >= target
+    if op == "lt":
+        return value < target
+    if op == "lte":
+        return value <= target
+    raise ValueError(f"unsupported operator: {op}")
+
+
+class FakePostgrest:
+    def __init__(
+        self,
+        tables: Optional[Dict[str, List[Row]]] = None,
+        *,
+        max_rows: Optional[int] = 1000,
+        latency_sec: float = 0.0,
+        per_row_sec: float = 0.0,
+        primary_keys: Optional[Dict[str, Tuple[str, ...]]] = None,
+    ) -> None:
+        self.tables = tables or {}
+        self.max_rows = max_rows
+        self.latency_sec = latency_sec
+        self.per_row_sec = per_row_sec
+        self.primary_keys = primary_keys or {}
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._sorted: Dict[Tuple[str, str], Tuple[List[Any], List[Row]]] = {}
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    @property
+    def url(self) -> str:
+        assert self._server is not None
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _range_scan(self, table: str, params: List[Tuple[str, str]]) -> Optional[List[Row]]:
+        # Keyset pages (col=gt.x&order=col.asc) are served by bisecting a sorted
+        # copy, like an index scan, so the fake stays cheap at 100k rows.
+        query = dict(params)
+        column, _, direction = query.get("order", "").partition(".")
+        filters = [(c, e) for c, e in params if c not in RESERVED_PARAMS]
+        if not column or "desc" in direction or "," in query["order"]:
+            return None
+        if any(c != column or e.partition(".")[0] not in RANGE_OPS for c, e in filters):
+            return None
+
+        with self._lock:
+            cached = self._sorted.get((table, column))
+            if cached is None:
+                rows = sorted(
+                    (r for r in self.tables.get(table, []) if r.get(column) is not None),
+                    key=lambda r: r[column],
+                )
+                cached = ([r[column] for r in rows], rows)
+                self._sorted[(table, column)] = cached
+        keys, rows = cached
+        lo, hi = 0, len(rows)
+        for _, expr in filters:
+            op, _, raw = expr.partition(".")
+            target = _coerce(raw, keys[0]) if keys else raw
+            if op == "gt":
+                lo = max(lo, bisect.bisect_right(keys, target))
+            elif op == "gte":
+                lo = max(lo, bisect.bisect_left(keys, target))
+            elif op == "lt":
+                hi = min(hi, bisect.bisect_left(keys, target))
+            else:
+                hi = min(hi, bisect.bisect_right(keys, target))
+        return rows[lo:hi]
+
+    def _filter(self, table: str, params: List[Tuple[str, str]]) -> List[Row]:
+        rows = self.tables.get(table, [])
+        for column, expr in params:
+            if column not in RESERVED_PARAMS:
+                rows = [r for r in rows if _matches(r, column, expr)]
+        return rows
+
+    def select(self, table: str, params: List[Tuple[str, str]]) -> List[Row]:
+        query = dict(params)
+        rows = self._range_scan(table, params)
+        if rows is None:
+            rows = self._filter(table, params)
+        else:
+            query.pop("order")
+
+        for term in reversed([t for t in query.get("order", "").split(",") if t]):
+            column, _, direction = term.partition(".")
+            rows = sorted(
+                rows,
+                key=lambda r: (r.get(column) is None, r.get(column)),
+                reverse="desc" in direction,
+            )
+
+        offset = int(query.get("offset", 0))
+        limit = int(query["limit"]) if "limit" in query else None
+        if self.max_rows is not None:
+            limit = self.max_rows if limit is None else min(limit, self.max_rows)
+        rows = rows[offset : offset + limit if limit is not None else None]
+
+        columns = query.get("select", "*")
+        if columns != "*":
+            names = columns.split(",")
+            rows = [{c: r.get(c) for c in names} for r in rows]
+        return rows
+
+    def upsert(self, table: str, payload: Any) -> List[Row]:
+        incoming = payload if isinstance(payload, list) else [payload]
+        key = self.primary_keys.get(table)
+        with self._lock:
+            self._sorted = {k: v for k, v in self._sorted.items() if k[0] != table}
+            rows = self.tables.setdefault(table, [])
+            for new in incoming:
+                existing = None
+                if key:
+                    existing = next(
+                        (r for r in rows if all(r.get(k) == new.get(k) for k in key)), None
+                    )
+                if existing is not None:
+                    existing.update(new)
+                else:
+                    rows.append(dict(new))
+        return incoming
+
+    def update(self, table: str, params: List[Tuple[str, str]], patch: Row) -> List[Row]:
+        with self._lock:
+            self._sorted = {k: v for k, v in self._sorted.items() if k[0] != table}
+            matched = self._filter(table, params)
+            for row in matched:
+                row.update(patch)
+        return matched
+
+    def start(self) -> "FakePostgrest":
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format: str, *args: Any) -> None:
+                pass
+
+            def _table_and_params(self) -> Tuple[str, List[Tuple[str, str]]]:
+                parts = urlsplit(self.path)
+                table = parts.path.rsplit("/", 1)[-1]
+                return table, parse_qsl(parts.query, keep_blank_values=True)
+
+            def _body(self) -> Any:
+                length = int(self.headers.get("Content-Length") or 0)
+                return orjson.loads(self.rfile.read(length)) if length else None
+
+            def _reply(self, rows: List[Row], status: int = 200) -> None:
+                with fake._lock:
+                    fake.requests += 1
+                time.sleep(fake.latency_sec + fake.per_row_sec * len(rows))
+                body = orjson.dumps(rows)
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self) -> None:
+                if self.path == "/__stats":
+                    self._reply([{"requests": fake.requests}])
+                    return
+                table, params = self._table_and_params()
+                self._reply(fake.select(table, params))
+
+            def do_POST(self) -> None:
+                table, _ = self._table_and_params()
+                self._reply(fake.upsert(table, self._body()), status=201)
+
+            def do_PATCH(self) -> None:
+                table, params = self._table_and_params()
+                self._reply(fake.update(table, params, self._body()))
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def serve_in_process(self) -> Tuple["multiprocessing.Process", str]:
+        ready: "multiprocessing.Queue[str]" = multiprocessing.Queue()
+        proc = multiprocessing.Process(target=_serve_forever, args=(self, ready), daemon=True)
+        proc.start()
+        return proc, ready.get(timeout=30)
+
+    def __enter__(self) -> "FakePostgrest":
+        return self.start()
+
+    def __exit__(self, *exc: Any) -> None:
+        self.stop()
+
+
+def _serve_forever(fake: FakePostgrest, ready: "multiprocessing.Queue[str]") -> None:
+    fake.start()
+    ready.put(fake.url)
+    threading.Event().wait()
@@ -0,0 +1,300 @@
+from __future__ import annotations
+
+import argparse
+import importlib.util
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import timeit
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from types import ModuleType
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import orjson
+import pandas as pd
+
+from bench.catalog_fetch import DUMMY_KEY, synthetic_catalog
+from mission_service.payloads import NUMERIC_FIELDS
+
+CORE_DIR = Path(__file__).resolve().parent.parent
+BASELINE_PATH = Path(__file__).resolve().parent / "baselines" / "micro.json"
+
+Result = Dict[str, Any]
+Bench = Tuple[str, Callable[[], Callable[[], Any]]]
+
+
+def _offline_services() -> Tuple[ModuleType, ModuleType]:
+    # The services read their config at import time; point every dependency
+    # at an address that is never contacted so the suite runs offline.
+    for name, value in {
+        "SUPABASE_URL": "http://127.0.0.1:9",
+        "SUPABASE_SERVICE_KEY": DUMMY_KEY,
+        "API_KEY": "bench",
+        "PREDICT_API_URL": "http://127.0.0.1:9",
+        "PREDICT_API_KEY": "bench",
+        "MISSION_API_URL": "http://127.0.0.1:9",
+        "MISSION_API_KEY": "bench",
+    }.items():
+        os.environ.setdefault(name, value)
+    for service in ("benefit_service", "mission_service"):
+        sys.path.insert(0, str(CORE_DIR / service))
+
+    spec = importlib.util.spec_from_file_location(
+        "mission_service_main", CORE_DIR / "mission_service" / "main.py"
+    )
+    mission = importlib.util.module_from_spec(spec)
+    sys.modules["mission_service_main"] = mission
+    spec.loader.exec_module(mission)
+    import supabase_client as benefit
+
+    return mission, benefit
+
+
+def nested_feature(rng: random.Random, *, depth: int = 4, width: int = 6) -> Dict[str, Any]:
+    row: Dict[str, Any] = {f: np.float64(rng.random()) for f in NUMERIC_FIELDS}
+    row.update(user_id="u-000001", gender="F", age_band="30s", avg_amount=np.int64(52_000))
+    row["use_ratio"] = float("nan")
+    node = row
+    for level in range(depth):
+        node["history"] = [
+            {
+                "date": (date(2026, 1, 1) + timedelta(days=i)).isoformat(),
+                "amounts": [np.float64(rng.random() * 1000) for _ in range(8)],
+                "share": float("nan") if i % 7 == 0 else rng.random(),
+                "count": np.int32(i),
+            }
+            for i in range(width * 10)
+        ]
+        node["child"] = {f"k{level}_{i}": np.float32(i) for i in range(width)}
+        node = node["child"]
+    return row
+
+
+def exclusion_ids(rng: random.Random, n: int) -> List[Any]:
+    ids: List[Any] = []
+    for i in range(n):
+        mission_id = rng.randrange(n // 2)
+        ids.append(
+            rng.choice([mission_id, str(mission_id), f" {mission_id} ", None, ""])
+            if i % 10 == 0
+            else str(mission_id)
+        )
+    return ids
+
+
+def feature_rows(rng: random.Random, n: int) -> List[Dict[str, Any]]:
+    rows = []
+    for i in range(n):
+        row: Dict[str, Any] = {f: rng.random() for f in NUMERIC_FIELDS}
+        row.update(
+            user_id=f"u-{i:06d}",
+            segment_id=f"seg-{i % 12}",
+            gender=rng.choice(["F", "M", None]),
+            age_band=rng.choice(["20s", "30s", "40s"]),
+            avg_amount=rng.randint(1_000, 200_000),
+        )
+        rows.append(row)
+    return rows
+
+
+def benchmarks(catalog_size: int) -> List[Bench]:
+    mission, benefit = _offline_services()
+    rng = random.Random(0)
+    catalog = synthetic_catalog(catalog_size)
+    for i, row in enumerate(catalog):
+        if i % 5 == 0:
+            row["discount_rate"] = None
+
+    def clean_jsonable():
+        feature = nested_feature(rng)
+        return lambda: mission._clean_jsonable(feature)
+
+    def unique_str_list():
+        ids = exclusion_ids(rng, 5_000)
+        return lambda: mission._unique_str_list(ids)
+
+    def to_date_str():
+        values = [
+            rng.choice([None, "2026-10-19", date(2026, 10, 19), datetime(2026, 10, 19, 9, 30)])
+            for _ in range(1_000)
+        ]
+        return lambda: [mission._to_date_str(v) for v in values]
+
+    def payload_single():
+        rows = feature_rows(rng, 1)
+        exclude = {rows[0]["user_id"]: mission._unique_str_list(exclusion_ids(rng, 1_000))}
+        return lambda: mission.build_mission_payloads(rows, k=3, exclude_ids=exclude)
+
+    def payload_batch():
+        rows = feature_rows(rng, 1_000)
+        exclude = {r["user_id"]: [str(j) for j in range(30)] for r in rows}
+        return lambda: mission.build_mission_payloads(rows, k=3, exclude_ids=exclude)
+
+    def records_pandas():
+        frame = benefit._benefit_frame(catalog)
+        return lambda: benefit.benefit_records(frame)
+
+    def records_shm():
+        from shared.shm_table import SharedTable, write_table
+
+        with tempfile.TemporaryDirectory(prefix="bench-micro-") as tmp:
+            path = os.path.join(tmp, "benefits.shm")
+            write_table(path, catalog, version="bench")
+            # The mapping outlives the file, just like after a republish.
+            table = SharedTable(path)
+        return table.records
+
+    def predict_payload():
+        records = pd.DataFrame(catalog).replace({np.nan: None}).to_dict(orient="records")
+        feature = feature_rows(rng, 1)[0]
+        payload = {
+            "paths": ["dummy"],
+            "config": {"input_data": feature, "uuid_id": "bench", "benefits": records},
+        }
+        return lambda: orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY)
+
+    n = f"{catalog_size // 1000}k"
+    return [
+        ("mission.clean_jsonable.nested", clean_jsonable),
+        ("mission.unique_str_list.5k", unique_str_list),
+        ("mission.to_date_str.1k", to_date_str),
+        ("mission.payload_input.1user_1k_exclusions", payload_single),
+        ("mission.payload_input.1k_users", payload_batch),
+        (f"benefit.records.pandas_{n}", records_pandas),
+        (f"benefit.records.shm_{n}", records_shm),
+        (f"benefit.predict_payload.serialize_{n}", predict_payload),
+    ]
+
+
+def measure(fn: Callable[[], Any], *, repeat: int, min_time: float) -> Result:
+    timer = timeit.Timer(fn)
+    number, elapsed = timer.autorange()
+    number = max(1, int(number * min_time / max(elapsed, 1e-9)))
+    per_op = [t / number * 1e6 for t in timer.repeat(repeat=repeat, number=number)]
+    return {
+        "min_us": round(min(per_op), 3),
+        "median_us": round(statistics.median(per_op), 3),
+        "number": number,
+        "repeat": repeat,
+    }
+
+
+def run(
+    *, pattern: Optional[str], catalog_size: int, repeat: int, min_time: float
+) -> Dict[str, Any]:
+    results: Dict[str, Result] = {}
+    for name, setup in benchmarks(catalog_size):
+        if pattern and pattern not in name:
+            continue
+        results[name] = measure(setup(), repeat=repeat, min_time=min_time)
+        r = results[name]
+        print(f"{name:<44} {r['min_us']:>14.2f} us  (median {r['median_us']:.2f})")
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "orjson": orjson.__version__,
+            "catalog_size": catalog_size,
+        },
+        "results": results,
+    }
+
+
+def compare(baseline: Dict[str, Any], candidate: Dict[str, Any], *, threshold: float, stat: str):
+    base, cand = baseline["results"], candidate["results"]
+    regressions = []
+    print(f"{'benchmark':<44} {'baseline us':>14} {'candidate us':>14} {'delta':>8}")
+    for name in sorted(set(base) | set(cand)):
+        if name not in base or name not in cand:
+            only = "baseline" if name in base else "candidate"
+            print(f"{name:<44} {'(only in ' + only + ')':>38}")
+            continue
+        b, c = base[name][stat], cand[name][stat]
+        delta = (c - b) / b if b else 0.0
+        flag = ""
+        if delta > threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        elif delta < -threshold:
+            flag = "  faster"
+        print(f"{name:<44} {b:>14.2f} {c:>14.2f} {delta * 100:>+7.1f}%{flag}")
+    if baseline.get("meta") != candidate.get("meta"):
+        print("note: environments differ; compare like with like", file=sys.stderr)
+    return regressions
+
+
+def _load(path: Path) -> Dict[str, Any]:
+    return orjson.loads(path.read_bytes())
+
+
+def _save(path: Path, results: Dict[str, Any]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(orjson.dumps(results, option=orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Microbenchmarks for data-shaping helpers")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def add_run_args(p: argparse.ArgumentParser) -> None:
+        p.add_argument("-k", dest="pattern", help="only run benchmarks whose name contains this")
+        p.add_argument("--catalog-size", type=int, default=10_000)
+        p.add_argument("--repeat", type=int, default=7)
+        p.add_argument("--min-time", type=float, default=0.2, help="seconds per repeat")
+
+    def add_compare_args(p: argparse.ArgumentParser) -> None:
+        p.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown ratio")
+        p.add_argument("--stat", choices=("min_us", "median_us"), default="min_us")
+
+    run_p = sub.add_parser("run", help="run the suite and optionally write results")
+    add_run_args(run_p)
+    run_p.add_argument("--out", type=Path)
+
+    check_p = sub.add_parser("check", help="run the suite against the stored baseline")
+    add_run_args(check_p)
+    add_compare_args(check_p)
+    check_p.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    check_p.add_argument("--update", action="store_true", help="overwrite the baseline instead")
+
+    cmp_p = sub.add_parser("compare", help="compare two result files")
+    cmp_p.add_argument("baseline", type=Path)
+    cmp_p.add_argument("candidate", type=Path)
+    add_compare_args(cmp_p)
+
+    args = parser.parse_args()
+    if args.command == "compare":
+        regressions = compare(
+            _load(args.baseline), _load(args.candidate), threshold=args.threshold, stat=args.stat
+        )
+        sys.exit(1 if regressions else 0)
+
+    results = run(
+        pattern=args.pattern,
+        catalog_size=args.catalog_size,
+        repeat=args.repeat,
+        min_time=args.min_time,
+    )
+    if args.command == "run":
+        if args.out:
+            _save(args.out, results)
+        return
+    if args.update or not args.baseline.exists():
+        _save(args.baseline, results)
+        print(f"baseline written to {args.baseline}")
+        return
+    baseline = _load(args.baseline)
+    if args.pattern:
+        baseline["results"] = {k: v for k, v in baseline["results"].items() if args.pattern in k}
+    regressions = compare(baseline, results, threshold=args.threshold, stat=args.stat)
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,346 @@
+from __future__ import annotations
+
+import argparse
+import gzip
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, Iterator, List
+
+import numpy as np
+import orjson
+import requests
+from requests.adapters import HTTPAdapter
+
+from bench.catalog_fetch import DUMMY_KEY, synthetic_catalog
+from bench.fake_postgrest import FakePostgrest
+from mission_service.payloads import NUMERIC_FIELDS
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+LOCAL_API_KEY = "replay"
+
+Record = Dict[str, Any]
+
+
+def load_log(path: str) -> List[Record]:
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rb") as f:
+        return [orjson.loads(line) for line in f if line.strip()]
+
+
+def _route(record: Record) -> str:
+    return f"{record['method']} {record['path']}"
+
+
+def _users(records: List[Record]) -> List[str]:
+    users = set()
+    for r in records:
+        body = r.get("body")
+        if isinstance(body, dict) and body.get("user_id"):
+            users.add(body["user_id"])
+        for part in (r.get("query") or "").split("&"):
+            key, _, value = part.partition("=")
+            if key == "user_id" and value:
+                users.add(value)
+    return sorted(users)
+
+
+def synthetic_features(users: List[str]) -> List[Record]:
+    rng = random.Random(0)
+    rows = []
+    for user_id in users:
+        row: Record = {
+            "user_id": user_id,
+            "snapshot_date": "2026-01-01",
+            "gender": rng.choice(["F", "M"]),
+            "age_band": rng.choice(["20s", "30s", "40s"]),
+        }
+        row.update({field: rng.random() for field in NUMERIC_FIELDS})
+        row["avg_amount"] = rng.randint(1_000, 100_000)
+        rows.append(row)
+    return rows
+
+
+class FakeModel:
+    def __init__(self, *, latency_ms: float, jitter_ms: float) -> None:
+        model = self
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args: Any) -> None:
+                pass
+
+            def do_POST(self) -> None:
+                body = orjson.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                time.sleep((model.latency_ms + random.uniform(0, model.jitter_ms)) / 1000)
+                data = orjson.dumps(model.respond(body))
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    @staticmethod
+    def respond(body: Record) -> Record:
+        if "config" in body:
+            clubs: Dict[str, List[Record]] = {}
+            for b in body["config"].get("benefits") or []:
+                offers = clubs.setdefault(b.get("domain") or "general", [])
+                if len(offers) < 5:
+                    offers.append(b)
+            return {
+                "data": {
+                    "club_domains": list(clubs)[:3],
+                    "clubs": [{"domain": d, "offers": o} for d, o in list(clubs.items())[:3]],
+                }
+            }
+        excluded = set(body.get("exclude_mission_ids") or [])
+        missions = [str(i) for i in range(1, 100) if str(i) not in excluded]
+        return {"data": {"results": [{"mission_id": m} for m in missions[: body.get("k", 3)]]}}
+
+    def stop(self) -> None:
+        self.server.shutdown()
+
+
+def _wait_healthy(url: str, proc: subprocess.Popen, timeout_sec: float = 60) -> None:
+    deadline = time.monotonic() + timeout_sec
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"gateway exited with status {proc.returncode}")
+        try:
+            if requests.get(f"{url}/health", timeout=1).ok:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("gateway did not become healthy")
+
+
+def local_stack(
+    stack: ExitStack,
+    records: List[Record],
+    *,
+    catalog_size: int,
+    model_latency_ms: float,
+    model_jitter_ms: float,
+    workers: int,
+    port: int,
+) -> str:
+    fake = FakePostgrest(
+        {
+            "user_feature_30d": synthetic_features(_users(records)),
+            "benefit_labeled": synthetic_catalog(catalog_size),
+            "user_mission_pool": [],
+            "user_mission_exclusion": [],
+            "user_selected_club": [],
+            "segment_default_recommendation": [
+                {
+                    "gender": None,
+                    "age_band": None,
+                    "club_result": {"data": {"clubs": []}},
+                    "mission_result": {"data": {"results": []}},
+                }
+            ],
+        },
+        max_rows=1000,
+        primary_keys={
+            "user_mission_pool": ("user_id", "date"),
+            "user_mission_exclusion": ("user_id",),
+            "user_selected_club": ("user_id",),
+        },
+    )
+    db_proc, db_url = fake.serve_in_process()
+    stack.callback(db_proc.terminate)
+
+    model = FakeModel(latency_ms=model_latency_ms, jitter_ms=model_jitter_ms)
+    stack.callback(model.stop)
+
+    env = {
+        **os.environ,
+        "SUPABASE_URL": db_url,
+        "SUPABASE_SERVICE_KEY": DUMMY_KEY,
+        "API_KEY": LOCAL_API_KEY,
+        "PREDICT_API_URL": model.url,
+        "PREDICT_API_KEY": LOCAL_API_KEY,
+        "MISSION_API_URL": model.url,
+        "MISSION_API_KEY": LOCAL_API_KEY,
+    }
+    env.pop("CAPTURE_PATH", None)
+    gateway = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "main:app",
+            "--port",
+            str(port),
+            "--workers",
+            str(workers),
+            "--log-level",
+            "warning",
+        ],
+        cwd=REPO_ROOT,
+        env=env,
+    )
+    stack.callback(gateway.terminate)
+    url = f"http://127.0.0.1:{port}"
+    _wait_healthy(url, gateway)
+    return url
+
+
+def _schedule(records: List[Record], speed: float) -> Iterator[Record]:
+    t0 = records[0]["ts"]
+    start = time.monotonic()
+    for r in records:
+        if speed > 0:
+            delay = start + (r["ts"] - t0) / speed - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        yield r
+
+
+def replay(
+    records: List[Record], *, target: str, api_key: str, speed: float, concurrency: int
+) -> List[Record]:
+    session = requests.Session()
+    session.mount("http://", HTTPAdapter(pool_maxsize=concurrency))
+    session.mount("https://", HTTPAdapter(pool_maxsize=concurrency))
+
+    def send(r: Record) -> Record:
+        url = f"{target}{r['path']}" + (f"?{r['query']}" if r.get("query") else "")
+        headers = {**(r.get("headers") or {}), "x-api-key": api_key}
+        data = orjson.dumps(r["body"]) if r.get("body") is not None else None
+        start = time.perf_counter()
+        try:
+            resp = session.request(r["method"], url, data=data, headers=headers, timeout=60)
+            status, size = resp.status_code, len(resp.content)
+        except requests.RequestException:
+            status, size = 0, 0
+        return {
+            "ts": time.time(),
+            "method": r["method"],
+            "path": r["path"],
+            "status": status,
+            "bytes": size,
+            "duration_ms": round((time.perf_counter() - start) * 1000, 3),
+            "recorded_status": r.get("status"),
+        }
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [pool.submit(send, r) for r in _schedule(records, speed)]
+        return [f.result() for f in futures]
+
+
+def summarize(records: List[Record]) -> Dict[str, Dict[str, float]]:
+    by_route: Dict[str, List[float]] = {}
+    for r in records:
+        by_route.setdefault(_route(r), []).append(r["duration_ms"])
+    out = {}
+    for route, durations in sorted(by_route.items()):
+        p50, p90, p99 = np.percentile(durations, [50, 90, 99])
+        out[route] = {"n": len(durations), "p50": p50, "p90": p90, "p99": p99}
+    return out
+
+
+def compare(baseline: List[Record], candidate: List[Record]) -> None:
+    base, cand = summarize(baseline), summarize(candidate)
+    print(f"{'route':<28} {'n':>6} " + " ".join(f"{q:>22}" for q in ("p50 ms", "p90 ms", "p99 ms")))
+    for route in sorted(set(base) | set(cand)):
+        b, c = base.get(route), cand.get(route)
+        cells = []
+        for q in ("p50", "p90", "p99"):
+            if b and c:
+                delta = (c[q] - b[q]) / b[q] * 100 if b[q] else 0.0
+                cells.append(f"{b[q]:>8.1f} -> {c[q]:>7.1f} {delta:>+4.0f}%")
+            else:
+                cells.append(f"{(b or c)[q]:>22.1f}")
+        print(f"{route:<28} {(c or b)['n']:>6} " + " ".join(cells))
+
+    mismatched = [r for r in candidate if r.get("recorded_status") not in (None, r["status"])]
+    if mismatched:
+        print(f"{len(mismatched)} responses differ in status from the recording")
+
+
+def _write_log(path: str, records: List[Record]) -> None:
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "wb") as f:
+        f.write(b"".join(orjson.dumps(r) + b"\n" for r in records))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Replay captured traffic and compare latency")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="replay a capture log against a target or a local stack")
+    run.add_argument("log")
+    run.add_argument("--target", help="base URL; omit to boot the gateway against local fakes")
+    run.add_argument("--api-key", default=LOCAL_API_KEY)
+    run.add_argument("--speed", type=float, default=1.0, help="time scale; 0 replays flat out")
+    run.add_argument("--concurrency", type=int, default=64)
+    run.add_argument("--limit", type=int)
+    run.add_argument("--warmup", type=int, default=20, help="untimed records sent first")
+    run.add_argument("--out", help="write replay timings here (same format, comparable later)")
+    run.add_argument("--workers", type=int, default=1, help="uvicorn workers for the local stack")
+    run.add_argument("--port", type=int, default=8765)
+    run.add_argument("--catalog-size", type=int, default=5000)
+    run.add_argument("--model-latency-ms", type=float, default=50.0)
+    run.add_argument("--model-jitter-ms", type=float, default=20.0)
+
+    cmp_ = sub.add_parser("compare", help="compare latency distributions of two logs")
+    cmp_.add_argument("baseline")
+    cmp_.add_argument("candidate")
+
+    args = parser.parse_args()
+    if args.command == "compare":
+        compare(load_log(args.baseline), load_log(args.candidate))
+        return
+
+    records = sorted(load_log(args.log), key=lambda r: r["ts"])[: args.limit]
+    if not records:
+        parser.error(f"{args.log} has no records")
+    with ExitStack() as stack:
+        target = args.target or local_stack(
+            stack,
+            records,
+            catalog_size=args.catalog_size,
+            model_latency_ms=args.model_latency_ms,
+            model_jitter_ms=args.model_jitter_ms,
+            workers=args.workers,
+            port=args.port,
+        )
+        target = target.rstrip("/")
+        if args.warmup:
+            replay(
+                records[: args.warmup],
+                target=target,
+                api_key=args.api_key,
+                speed=0,
+                concurrency=args.concurrency,
+            )
+        results = replay(
+            records,
+            target=target,
+            api_key=args.api_key,
+            speed=args.speed,
+            concurrency=args.concurrency,
+        )
+    if args.out:
+        _write_log(args.out, results)
+    compare(records, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+from __future__ import annotations
+
+import argparse
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from shared.clients import get_http
+from shared.upstream import POLICIES, UpstreamPool
+
+
+class FakeReplica:
+    def __init__(self, *, latency_ms: float, jitter_ms: float = 0.0, error_rate: float = 0.0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        replica = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args) -> None:
+                pass
+
+            def do_POST(self) -> None:
+                self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                delay = replica.latency_ms + random.uniform(0, replica.jitter_ms)
+                time.sleep(delay / 1000)
+                status = 500 if random.random() < replica.error_rate else 200
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", "2")
+                self.end_headers()
+                self.wfile.write(b"{}")
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def stop(self) -> None:
+        self.server.shutdown()
+
+
+def _parse_replica(spec: str) -> Tuple[float, float, float]:
+    # latency_ms[:jitter_ms[:error_rate]]
+    parts = [float(p) for p in spec.split(":")] + [0.0, 0.0]
+    return parts[0], parts[1], parts[2]
+
+
+def _drive(pool: UpstreamPool, *, requests: int, concurrency: int) -> Tuple[np.ndarray, int]:
+    session = get_http()
+
+    def one(_: int) -> Optional[float]:
+        start = time.perf_counter()
+        try:
+            r = pool.post(session, data=b"{}", timeout=5)
+        except Exception:
+            return None
+        return time.perf_counter() - start if r.status_code == 200 else None
+
+    with ThreadPoolExecutor(max_workers=concurrency) as ex:
+        results = list(ex.map(one, range(requests)))
+    latencies = np.array([r for r in results if r is not None]) * 1000
+    errors = sum(r is None for r in results)
+    return latencies, errors
+
+
+def run(replicas: List[str], *, requests: int, concurrency: int, policies: List[str]) -> None:
+    fakes = [
+        FakeReplica(**dict(zip(("latency_ms", "jitter_ms", "error_rate"), _parse_replica(s))))
+        for s in replicas
+    ]
+    urls = [f.url for f in fakes]
+    print(f"replicas={replicas} requests={requests} concurrency={concurrency}")
+    print(f"{'policy':<18} {'p50':>7} {'p95':>7} {'p99':>7} {'errors':>7}  share")
+    try:
+        for policy in policies:
+            if policy == "single":
+                pool = UpstreamPool(urls[:1], policy="least_outstanding")
+            else:
+                pool = UpstreamPool(urls, policy=policy, eject_sec=5, slow_start_sec=5)
+            latencies, errors = _drive(pool, requests=requests, concurrency=concurrency)
+            p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) if len(latencies) else (0, 0, 0)
+            share: Dict[str, int] = {
+                str(i): ep["requests"] for i, ep in enumerate(pool.stats()["endpoints"])
+            }
+            print(f"{policy:<18} {p50:>7.1f} {p95:>7.1f} {p99:>7.1f} {errors:>7}  {share}")
+    finally:
+        for f in fakes:
+            f.stop()
+
+
+def _requests_by_replica(pool: UpstreamPool) -> List[int]:
+    return [ep["requests"] for ep in pool.stats()["endpoints"]]
+
+
+def _drive_share(pool: UpstreamPool, *, requests: int, concurrency: int) -> List[int]:
+    before = _requests_by_replica(pool)
+    _drive(pool, requests=requests, concurrency=concurrency)
+    return [after - b for after, b in zip(_requests_by_replica(pool), before)]
+
+
+def check_ejection_and_slow_start() -> None:
+    good, bad = FakeReplica(latency_ms=10), FakeReplica(latency_ms=10, error_rate=1.0)
+    try:
+        pool = UpstreamPool(
+            [good.url, bad.url],
+            policy="least_outstanding",
+            eject_after_failures=3,
+            eject_sec=0.5,
+            slow_start_sec=2.0,
+        )
+        _drive(pool, requests=30, concurrency=1)
+        stats = pool.stats()["endpoints"]
+        assert stats[1]["ejected"], f"failing replica was not ejected: {stats[1]}"
+        assert stats[1]["failures"] == 3, f"expected ejection after 3 failures: {stats[1]}"
+        assert stats[0]["failures"] == 0, f"healthy replica saw failures: {stats[0]}"
+
+        bad.error_rate = 0.0
+        time.sleep(0.6)
+        ramp = _drive_share(pool, requests=200, concurrency=8)
+        assert not pool.stats()["endpoints"][1]["ejected"], "replica still ejected after eject_sec"
+        assert ramp[1] < ramp[0] / 2, f"recovered replica skipped slow start: {ramp}"
+
+        time.sleep(2.0)
+        settled = _drive_share(pool, requests=200, concurrency=8)
+        assert min(settled) > 0.3 * sum(settled), f"recovered replica did not rejoin: {settled}"
+    finally:
+        good.stop()
+        bad.stop()
+
+
+def check_ewma_prefers_fast() -> None:
+    fast, slow = FakeReplica(latency_ms=10), FakeReplica(latency_ms=100)
+    try:
+        pool = UpstreamPool([fast.url, slow.url], policy="ewma")
+        # Sequential calls leave outstanding counts tied, so only latency decides.
+        share = _drive_share(pool, requests=60, concurrency=1)
+        assert share[0] > 0.85 * sum(share), f"ewma did not prefer the fast replica: {share}"
+    finally:
+        fast.stop()
+        slow.stop()
+
+
+def check_least_outstanding_spreads() -> None:
+    fakes = [FakeReplica(latency_ms=20) for _ in range(3)]
+    try:
+        pool = UpstreamPool([f.url for f in fakes], policy="least_outstanding")
+        share = _drive_share(pool, requests=300, concurrency=6)
+        assert all(0.25 < n / sum(share) < 0.42 for n in share), f"uneven spread: {share}"
+    finally:
+        for f in fakes:
+            f.stop()
+
+
+CHECKS: Dict[str, Callable[[], None]] = {
+    "ejection_and_slow_start": check_ejection_and_slow_start,
+    "ewma_prefers_fast": check_ewma_prefers_fast,
+    "least_outstanding_spreads": check_least_outstanding_spreads,
+}
+
+
+def check() -> int:
+    failed = 0
+    for name, fn in CHECKS.items():
+        try:
+            fn()
+        except AssertionError as exc:
+            failed += 1
+            print(f"FAIL {name}: {exc}")
+        else:
+            print(f"ok   {name}")
+    return failed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Compare and check upstream load-balancing policies"
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run_p = sub.add_parser("run", help="compare policies on a mix of fake replicas")
+    run_p.add_argument(
+        "--replicas",
+        nargs="+",
+        default=["20:10", "20:10", "200:50", "20:10:0.5"],
+        help="latency_ms[:jitter_ms[:error_rate]] per fake replica",
+    )
+    run_p.add_argument("--requests", type=int, default=2000)
+    run_p.add_argument("--concurrency", type=int, default=16)
+    run_p.add_argument(
+        "--policies", nargs="+", default=["single", *POLICIES], choices=["single", *POLICIES]
+    )
+
+    sub.add_parser("check", help="assert ejection, slow start and policy behavior")
+
+    args = parser.parse_args()
+    if args.command == "check":
+        sys.exit(1 if check() else 0)
+    run(
+        args.replicas,
+        requests=args.requests,
+        concurrency=args.concurrency,
+        policies=args.policies,
+    )
+
+
+if __name__ == "__main__":
+    main()
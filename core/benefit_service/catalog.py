@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from supabase import AsyncClient
+
+Row = Dict[str, Any]
+
+
+def _page_query(
+    sb: Any,
+    table: str,
+    key: str,
+    *,
+    after: Any,
+    lo: Any,
+    hi: Any,
+    page_size: int,
+) -> Any:
+    q = sb.table(table).select("*")
+    if after is not None:
+        q = q.gt(key, after)
+    elif lo is not None:
+        q = q.gte(key, lo)
+    if hi is not None:
+        q = q.lt(key, hi)
+    return q.order(key).limit(page_size)
+
+
+async def _apage(sb: AsyncClient, table: str, key: str, **bounds: Any) -> List[Row]:
+    return (await _page_query(sb, table, key, **bounds).execute()).data or []
+
+
+async def _ascan(
+    sb: AsyncClient,
+    table: str,
+    key: str,
+    *,
+    lo: Any = None,
+    hi: Any = None,
+    page_size: int,
+    sink: Callable[[List[Row]], None],
+) -> None:
+    # Stop on an empty page rather than a short one: PostgREST's max-rows
+    # can silently cap a page below page_size.
+    after = None
+    while True:
+        rows = await _apage(sb, table, key, after=after, lo=lo, hi=hi, page_size=page_size)
+        if not rows:
+            return
+        sink(rows)
+        after = rows[-1][key]
+
+
+async def _akey_bounds(sb: AsyncClient, table: str, key: str) -> Optional[Tuple[Any, Any]]:
+    first, last = await asyncio.gather(
+        sb.table(table).select(key).order(key).limit(1).execute(),
+        sb.table(table).select(key).order(key, desc=True).limit(1).execute(),
+    )
+    if not first.data or not last.data:
+        return None
+    return first.data[0][key], last.data[0][key]
+
+
+def _shards(lo: int, hi: int, n: int) -> List[Tuple[Optional[int], Optional[int]]]:
+    span = hi - lo + 1
+    n = max(1, min(n, span))
+    edges = [lo + span * i // n for i in range(n)]
+    return [(edges[i], edges[i + 1] if i + 1 < n else None) for i in range(n)]
+
+
+async def afetch_rows(
+    sb: AsyncClient,
+    table: str,
+    *,
+    key: str = "id",
+    page_size: int = 1000,
+    workers: int = 4,
+) -> List[Row]:
+    # Integer keys are split into shards that run as concurrent requests on
+    # the shared connection pool.
+    rows: List[Row] = []
+    bounds = await _akey_bounds(sb, table, key) if workers > 1 else None
+    if (
+        bounds is None
+        or not all(isinstance(b, int) for b in bounds)
+        or bounds[1] - bounds[0] < page_size
+    ):
+        lo = bounds[0] if bounds else None
+        await _ascan(sb, table, key, lo=lo, page_size=page_size, sink=rows.extend)
+        return rows
+
+    shards = _shards(bounds[0], bounds[1], min(workers, (bounds[1] - bounds[0]) // page_size + 1))
+    await asyncio.gather(
+        *(
+            _ascan(sb, table, key, lo=lo, hi=hi, page_size=page_size, sink=rows.extend)
+            for lo, hi in shards
+        )
+    )
+    rows.sort(key=lambda r: r[key])
+    return rows
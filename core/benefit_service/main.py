@@ -1,26 +1,56 @@
+import sys
 import uuid
+from pathlib import Path
 from typing import Optional
 
-from fastapi import FastAPI, Header, HTTPException
+from fastapi import APIRouter, Depends, FastAPI, Header, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, Response
 from pydantic import BaseModel
 
-from supabase_client import call_predict_api, leave_user_club, save_user_club
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from shared.admission import rate_limiter_from_env
+from shared.capture import install_capture
+from shared.clients import supabase_lifespan
+from shared.idempotency import run_idempotent
+from shared.profiling import admin_router, run_in_threadpool
+from shared.deadline import DeadlineRoute
+from shared.cold_start import FeatureNotFound
+from shared.etag import DEGRADED_HEADERS, etag_for, etag_matches
+from memo import PREDICT_MEMO_CACHE
+from offers import Projection
+from supabase_client import (
+    PREDICT_UPSTREAM,
+    call_predict_api,
+    call_predict_api_raw,
+    club_offers,
+    default_predict_result,
+    fetch_predict_body,
+    predict_etag,
+    leave_user_club,
+    save_user_club,
+)
 
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 API_KEY = os.getenv("API_KEY")
+PREDICT_PASSTHROUGH = os.getenv("PREDICT_PASSTHROUGH", "1") == "1"
+PREDICT_RATE_LIMITER = rate_limiter_from_env("PREDICT")
 
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse, lifespan=supabase_lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=False,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "Server-Timing"],
 )
+install_capture(app)
+router = APIRouter(route_class=DeadlineRoute)
 
 
 def _check_api_key(x_api_key: Optional[str]):
@@ -30,6 +60,8 @@ def _check_api_key(x_api_key: Optional[str]):
 
 class PredictRequest(BaseModel):
     user_id: str
+    gender: Optional[str] = None
+    age_band: Optional[str] = None
 
 
 class SelectClubRequest(BaseModel):
@@ -46,21 +78,139 @@ def health():
     return {"ok": True}
 
 
-@app.post("/predict")
-def predict_route(req: PredictRequest, x_api_key: str = Header(None)):
+async def _default_or_404(gender: Optional[str], age_band: Optional[str]) -> dict:
+    default = await default_predict_result(gender=gender, age_band=age_band)
+    if default is None:
+        raise HTTPException(status_code=404, detail="No features or segment default for user")
+    return default
+
+
+def _projection(
+    fields: Optional[str] = Query(None, description="comma-separated data or offer fields"),
+    club_domain: Optional[str] = Query(None, description="comma-separated club domains"),
+    max_offers: Optional[int] = Query(None, ge=0),
+) -> Optional[Projection]:
+    return Projection.from_query(fields=fields, club_domain=club_domain, max_offers=max_offers)
+
+
+def _predict_response(
+    body: bytes, projection: Optional[Projection], headers: Optional[dict] = None
+) -> Response:
+    if projection is not None:
+        body = projection.apply_bytes(body)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+@router.post("/predict")
+async def predict_route(
+    req: PredictRequest,
+    projection: Optional[Projection] = Depends(_projection),
+    x_api_key: str = Header(None),
+):
+    _check_api_key(x_api_key)
+    PREDICT_RATE_LIMITER.check(req.user_id)
+    try:
+        if PREDICT_PASSTHROUGH:
+            body = await call_predict_api_raw(user_id=req.user_id, uuid_id=str(uuid.uuid4()))
+            return _predict_response(body, projection)
+        result = await call_predict_api(user_id=req.user_id, uuid_id=str(uuid.uuid4()))
+    except FeatureNotFound:
+        result = await _default_or_404(req.gender, req.age_band)
+    return projection.apply(result) if projection is not None else result
+
+
+@router.get("/predict")
+async def predict_get_route(
+    user_id: str,
+    gender: Optional[str] = None,
+    age_band: Optional[str] = None,
+    projection: Optional[Projection] = Depends(_projection),
+    x_api_key: str = Header(None),
+    if_none_match: Optional[str] = Header(None),
+):
+    _check_api_key(x_api_key)
+    try:
+        etag = await predict_etag(user_id=user_id)
+    except FeatureNotFound:
+        default = await _default_or_404(gender, age_band)
+        return projection.apply(default) if projection is not None else default
+
+    if projection is not None:
+        etag = etag_for(etag, projection.key())
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    PREDICT_RATE_LIMITER.check(user_id)
+    body, fresh = await fetch_predict_body(user_id=user_id, uuid_id=str(uuid.uuid4()))
+    return _predict_response(body, projection, headers if fresh else DEGRADED_HEADERS)
+
+
+@router.get("/clubs/{domain}/offers")
+async def club_offers_route(
+    domain: str,
+    user_id: str,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100),
+    brand_code: Optional[str] = None,
+    x_api_key: str = Header(None),
+):
+    _check_api_key(x_api_key)
+    offers = await run_in_threadpool(club_offers, user_id)
+    if offers is None:
+        # Nothing indexed for this user yet: pay for one predict call.
+        PREDICT_RATE_LIMITER.check(user_id)
+        try:
+            await call_predict_api_raw(user_id=user_id, uuid_id=str(uuid.uuid4()))
+        except FeatureNotFound:
+            raise HTTPException(status_code=404, detail="No predict result for user")
+        offers = await run_in_threadpool(club_offers, user_id)
+
+    page = (
+        offers.page(domain, offset=offset, limit=limit, brand_code=brand_code) if offers else None
+    )
+    if page is None:
+        raise HTTPException(status_code=404, detail="Club is not in the user's predict result")
+    return {"user_id": user_id, **page}
+
+
+@router.get("/predict/upstream/stats")
+def predict_upstream_stats(x_api_key: str = Header(None)):
+    _check_api_key(x_api_key)
+    return PREDICT_UPSTREAM.stats()
+
+
+@router.get("/predict/memo/stats")
+def predict_memo_stats(x_api_key: str = Header(None)):
     _check_api_key(x_api_key)
-    return call_predict_api(user_id=req.user_id, segment_id="", uuid_id=str(uuid.uuid4()))
+    if PREDICT_MEMO_CACHE is None:
+        return {"enabled": False}
+    return {"enabled": True, **PREDICT_MEMO_CACHE.stats()}
 
 
-@app.post("/select_club")
-def select_club_route(req: SelectClubRequest, x_api_key: str = Header(None)):
+@router.post("/select_club")
+async def select_club_route(
+    req: SelectClubRequest,
+    x_api_key: str = Header(None),
+    idempotency_key: Optional[str] = Header(None),
+):
     _check_api_key(x_api_key)
-    save_user_club(req.user_id, req.club_domain)
-    return {"status": "ok"}
 
+    async def _select() -> dict:
+        await save_user_club(req.user_id, req.club_domain)
+        return {"status": "ok"}
 
-@app.post("/leave_club")
-def leave_club_route(req: LeaveClubRequest, x_api_key: str = Header(None)):
+    return await run_idempotent(
+        f"select_club:{req.user_id}", idempotency_key, req.model_dump(), _select
+    )
+
+
+@router.post("/leave_club")
+async def leave_club_route(req: LeaveClubRequest, x_api_key: str = Header(None)):
     _check_api_key(x_api_key)
-    leave_user_club(req.user_id)
+    await leave_user_club(req.user_id)
     return {"status": "ok"}
+
+
+app.include_router(router)
+app.include_router(admin_router)
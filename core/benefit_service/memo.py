@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import math
+import os
+import random
+import threading
+from typing import Any, Dict, Optional, Set, Tuple
+
+import orjson
+
+from shared.cache import TTLCache
+from shared.etag import fingerprint
+
+PREDICT_MEMO = os.getenv("PREDICT_MEMO", "0") == "1"
+PREDICT_MEMO_STEP = float(os.getenv("PREDICT_MEMO_STEP", "0.02"))
+PREDICT_MEMO_TTL_SEC = float(os.getenv("PREDICT_MEMO_TTL_SEC", "600"))
+PREDICT_MEMO_MAXSIZE = int(os.getenv("PREDICT_MEMO_MAXSIZE", "20000"))
+PREDICT_MEMO_VERIFY_RATE = float(os.getenv("PREDICT_MEMO_VERIFY_RATE", "0.01"))
+PREDICT_MEMO_IGNORE = frozenset(
+    os.getenv("PREDICT_MEMO_IGNORE", "user_id,snapshot_date,created_at,updated_at,id").split(",")
+)
+PERSONAL_FIELDS = ("user_id", "uuid_id")
+
+
+def _quantize(value: Any, step: float) -> Any:
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return value
+    if math.isnan(value):
+        return None
+    # Shares sit in [0, 1] and bucket linearly; amounts bucket on a log scale
+    # so the same step means the same relative change.
+    if abs(value) <= 1:
+        return round(value / step)
+    return f"{'-' if value < 0 else ''}L{round(math.log(abs(value)) / math.log1p(step))}"
+
+
+def _personalize(value: Any, fields: Dict[str, str]) -> Any:
+    if isinstance(value, dict):
+        return {k: fields[k] if k in fields else _personalize(v, fields) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_personalize(v, fields) for v in value]
+    return value
+
+
+def _signature(body: bytes) -> Set[Tuple[str, ...]]:
+    data = (orjson.loads(body) or {}).get("data") or {}
+    sig: Set[Tuple[str, ...]] = {("club", str(d)) for d in data.get("club_domains") or []}
+    for club in data.get("clubs") or []:
+        for offer in club.get("offers") or []:
+            sig.add((str(club.get("domain")), str(offer.get("brand_code") or offer.get("title"))))
+    return sig
+
+
+def drift(cached: bytes, fresh: bytes) -> float:
+    a, b = _signature(cached), _signature(fresh)
+    if not a and not b:
+        return 0.0
+    return 1 - len(a & b) / len(a | b)
+
+
+class PredictMemo:
+    def __init__(
+        self,
+        *,
+        step: float,
+        ttl_sec: float,
+        maxsize: int,
+        verify_rate: float,
+        ignore: frozenset = PREDICT_MEMO_IGNORE,
+    ) -> None:
+        self.step = step
+        self.verify_rate = verify_rate
+        self.ignore = ignore
+        self._cache = TTLCache(ttl_sec=ttl_sec, maxsize=maxsize)
+        self._lock = threading.Lock()
+        self._counts = {"hits": 0, "misses": 0, "verified": 0, "exact": 0}
+        self._drift_sum = 0.0
+        self._drift_max = 0.0
+
+    def key(self, input_data: Dict[str, Any], catalog_version: str) -> str:
+        features = sorted(
+            (k, _quantize(v, self.step)) for k, v in input_data.items() if k not in self.ignore
+        )
+        return fingerprint(features, catalog_version)
+
+    def get(self, key: str) -> Optional[bytes]:
+        body = self._cache.get(key)
+        with self._lock:
+            self._counts["hits" if body is not None else "misses"] += 1
+        return body
+
+    def set(self, key: str, body: bytes) -> None:
+        self._cache.set(key, body)
+
+    def should_verify(self) -> bool:
+        return random.random() < self.verify_rate
+
+    def record_drift(self, cached: bytes, fresh: bytes) -> None:
+        value = drift(cached, fresh)
+        with self._lock:
+            self._counts["verified"] += 1
+            self._counts["exact"] += value == 0
+            self._drift_sum += value
+            self._drift_max = max(self._drift_max, value)
+
+    @staticmethod
+    def personalize(body: bytes, **fields: str) -> bytes:
+        if not any(f'"{k}"'.encode() in body for k in fields):
+            return body
+        return orjson.dumps(_personalize(orjson.loads(body), fields))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = dict(self._counts)
+            drift_sum, drift_max = self._drift_sum, self._drift_max
+        lookups = counts["hits"] + counts["misses"]
+        verified = counts["verified"]
+        return {
+            **counts,
+            "step": self.step,
+            "verify_rate": self.verify_rate,
+            "hit_rate": counts["hits"] / lookups if lookups else None,
+            "exact_rate": counts["exact"] / verified if verified else None,
+            "mean_drift": drift_sum / verified if verified else None,
+            "max_drift": drift_max if verified else None,
+        }
+
+
+PREDICT_MEMO_CACHE = (
+    PredictMemo(
+        step=PREDICT_MEMO_STEP,
+        ttl_sec=PREDICT_MEMO_TTL_SEC,
+        maxsize=PREDICT_MEMO_MAXSIZE,
+        verify_rate=PREDICT_MEMO_VERIFY_RATE,
+    )
+    if PREDICT_MEMO
+    else None
+)
@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+import os
+import threading
+from typing import Any, Dict, FrozenSet, List, Optional
+
+import orjson
+
+from shared.cache import TTLCache
+
+OFFER_INDEX_TTL_SEC = float(os.getenv("OFFER_INDEX_TTL_SEC", "1800"))
+OFFER_INDEX_MAXSIZE = int(os.getenv("OFFER_INDEX_MAXSIZE", "50000"))
+DATA_FIELDS = frozenset({"cluster", "club_domains", "clubs"})
+
+
+def _split(value: Optional[str]) -> Optional[FrozenSet[str]]:
+    if not value:
+        return None
+    return frozenset(part.strip() for part in value.split(",") if part.strip())
+
+
+class Projection:
+    __slots__ = ("data_fields", "offer_fields", "club_domains", "max_offers")
+
+    def __init__(
+        self,
+        *,
+        fields: Optional[str] = None,
+        club_domain: Optional[str] = None,
+        max_offers: Optional[int] = None,
+    ) -> None:
+        names = _split(fields)
+        # Names that are not top-level data keys select offer fields and
+        # imply "clubs", so fields=club_domains,title is enough for a teaser.
+        self.data_fields = names & DATA_FIELDS if names is not None else None
+        self.offer_fields = names - DATA_FIELDS if names is not None else None
+        if self.offer_fields:
+            self.data_fields |= {"clubs"}
+        self.club_domains = _split(club_domain)
+        self.max_offers = max_offers
+
+    @classmethod
+    def from_query(
+        cls,
+        *,
+        fields: Optional[str] = None,
+        club_domain: Optional[str] = None,
+        max_offers: Optional[int] = None,
+    ) -> Optional["Projection"]:
+        if not fields and not club_domain and max_offers is None:
+            return None
+        return cls(fields=fields, club_domain=club_domain, max_offers=max_offers)
+
+    def key(self) -> List[Any]:
+        return [
+            sorted(self.data_fields) if self.data_fields is not None else None,
+            sorted(self.offer_fields) if self.offer_fields is not None else None,
+            sorted(self.club_domains) if self.club_domains is not None else None,
+            self.max_offers,
+        ]
+
+    def _club(self, club: Dict[str, Any]) -> Dict[str, Any]:
+        offers = club.get("offers") or []
+        if self.max_offers is not None:
+            offers = offers[: self.max_offers]
+        if self.offer_fields:
+            offers = [{k: o[k] for k in self.offer_fields if k in o} for o in offers]
+        return {**club, "offers": offers}
+
+    def apply(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        data = result.get("data")
+        if not isinstance(data, dict):
+            return result
+        if self.data_fields is not None:
+            data = {k: v for k, v in data.items() if k in self.data_fields}
+        if "clubs" in data:
+            clubs = data["clubs"] or []
+            if self.club_domains is not None:
+                clubs = [c for c in clubs if c.get("domain") in self.club_domains]
+            data = {**data, "clubs": [self._club(c) for c in clubs]}
+        return {**result, "data": data}
+
+    def apply_bytes(self, body: bytes) -> bytes:
+        result = orjson.loads(body)
+        if not isinstance(result, dict):
+            return body
+        return orjson.dumps(self.apply(result))
+
+
+class ClubOffers:
+    __slots__ = ("cluster", "club_domains", "offers", "by_brand")
+
+    def __init__(self, result: Dict[str, Any]) -> None:
+        data = result.get("data") or {}
+        self.cluster = data.get("cluster")
+        self.club_domains: List[str] = list(data.get("club_domains") or [])
+        self.offers: Dict[str, List[Dict[str, Any]]] = {}
+        self.by_brand: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        for club in data.get("clubs") or []:
+            domain = club.get("domain")
+            if domain is None:
+                continue
+            offers = list(club.get("offers") or [])
+            self.offers[domain] = offers
+            self.by_brand[domain] = {
+                str(o["brand_code"]): o for o in offers if o.get("brand_code") is not None
+            }
+
+    def page(
+        self, domain: str, *, offset: int, limit: int, brand_code: Optional[str] = None
+    ) -> Optional[Dict[str, Any]]:
+        if domain not in self.offers:
+            return None
+        if brand_code is not None:
+            offer = self.by_brand[domain].get(brand_code)
+            offers = [offer] if offer is not None else []
+        else:
+            offers = self.offers[domain]
+        end = offset + limit
+        return {
+            "domain": domain,
+            "cluster": self.cluster,
+            "total": len(offers),
+            "offset": offset,
+            "limit": limit,
+            "next_offset": end if end < len(offers) else None,
+            "offers": offers[offset:end],
+        }
+
+
+class OfferIndex:
+    # /predict stores the raw body; it is decoded into ClubOffers only when
+    # the offers endpoint first asks for that user.
+    def __init__(self, *, ttl_sec: float, maxsize: int) -> None:
+        self._cache = TTLCache(ttl_sec=ttl_sec, maxsize=maxsize)
+        self._lock = threading.Lock()
+
+    def update(self, user_id: str, body: bytes) -> None:
+        with self._lock:
+            self._cache.set(user_id, body)
+
+    def get(self, user_id: str) -> Optional[ClubOffers]:
+        value = self._cache.get(user_id)
+        if not isinstance(value, bytes):
+            return value
+        try:
+            result = orjson.loads(value)
+        except orjson.JSONDecodeError:
+            result = None
+        offers = ClubOffers(result) if isinstance(result, dict) else None
+        with self._lock:
+            # Skip the swap if a newer body arrived while this one was decoded.
+            if self._cache.get(user_id) is value:
+                if offers is None:
+                    self._cache.pop(user_id)
+                else:
+                    self._cache.set(user_id, offers)
+        return offers
+
+
+OFFER_INDEX = OfferIndex(ttl_sec=OFFER_INDEX_TTL_SEC, maxsize=OFFER_INDEX_MAXSIZE)
@@ -1,14 +1,44 @@
+import asyncio
+import contextvars
+import functools
+import logging
 import os
-from typing import Dict, Optional
+from typing import Any, Dict, List, Optional, Tuple, Union
 
 import numpy as np
+import orjson
 import pandas as pd
 import requests
 from dotenv import load_dotenv
-from supabase import create_client
+from fastapi import HTTPException
+from supabase import AsyncClient
+
+from catalog import afetch_rows
+from memo import PREDICT_MEMO_CACHE
+from offers import OFFER_INDEX, ClubOffers
+from shared import queries
+from shared.admission import limiter_from_env
+from shared.cache import SingleFlight, catalog_cache, feature_cache
+from shared.clients import get_async_supabase, get_http
+from shared.cold_start import (
+    FeatureNotFound,
+    missing_feature_cache,
+    segment_default,
+    segment_id_for,
+)
+from shared.deadline import DeadlineExceeded, propagate
+from shared.deadline import timeout as deadline_timeout
+from shared.disk_cache import aremember, arecall, recall, warm_once
+from shared.etag import etag_for, fingerprint
+from shared.profiling import run_in_threadpool
+from shared.shm_table import SharedTable, SharedTableStore
+from shared.tracing import SPAN_KIND_CLIENT, span
+from shared.upstream import upstream_from_env
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 
 def _required_env(name: str) -> str:
     value = os.getenv(name)
@@ -21,63 +51,260 @@ SUPABASE_URL = _required_env("SUPABASE_URL")
 SUPABASE_SERVICE_KEY = _required_env("SUPABASE_SERVICE_KEY")
 PREDICT_API_URL = _required_env("PREDICT_API_URL")
 PREDICT_API_KEY = _required_env("PREDICT_API_KEY")
+BENEFIT_KEY_COLUMN = os.getenv("BENEFIT_KEY_COLUMN", "id")
+BENEFIT_PAGE_SIZE = int(os.getenv("BENEFIT_PAGE_SIZE", "1000"))
+BENEFIT_FETCH_WORKERS = int(os.getenv("BENEFIT_FETCH_WORKERS", "4"))
+BENEFIT_SHM_PATH = os.getenv("BENEFIT_SHM_PATH")
+
+PREDICT_LIMITER = limiter_from_env("PREDICT")
+PREDICT_UPSTREAM = upstream_from_env("PREDICT", PREDICT_API_URL)
+SHARED_BENEFITS = (
+    SharedTableStore(BENEFIT_SHM_PATH, max_age_sec=catalog_cache.ttl_sec)
+    if BENEFIT_SHM_PATH
+    else None
+)
+_benefits_publish = SingleFlight()
+
 
-sb = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
+async def _db() -> AsyncClient:
+    return await get_async_supabase(SUPABASE_URL, SUPABASE_SERVICE_KEY)
 
 
-def save_user_club(user_id: str, club_domain: str):
-    sb.table("user_selected_club").upsert(
+async def save_user_club(user_id: str, club_domain: str):
+    sb = await _db()
+    await sb.table("user_selected_club").upsert(
         {"user_id": user_id, "club_domain": club_domain, "status": "ACTIVE"}
     ).execute()
 
 
-def leave_user_club(user_id: str):
-    sb.table("user_selected_club").update({"status": "LEFT"}).eq("user_id", user_id).execute()
+async def leave_user_club(user_id: str):
+    sb = await _db()
+    await sb.table("user_selected_club").update({"status": "LEFT"}).eq("user_id", user_id).execute()
 
 
 def _predict_headers() -> Dict[str, str]:
     return {"Content-Type": "application/json", "x-api-key": PREDICT_API_KEY}
 
 
-def fetch_user_feature(user_id: str) -> Dict:
-    resp = sb.table("user_feature_30d").select("*").eq("user_id", user_id).execute()
+async def _load_user_feature(user_id: str) -> Optional[Dict]:
+    sb = await _db()
+    resp = await queries.latest_feature(sb, user_id).execute()
     if not resp.data:
-        raise ValueError(f"user_feature not found for user_id={user_id}")
+        return None
+    await aremember("feature", user_id, resp.data[0])
     return resp.data[0]
 
 
-def fetch_benefits() -> pd.DataFrame:
-    resp = sb.table("benefit_labeled").select("*").execute()
-    if not resp.data:
-        return pd.DataFrame()
-    return pd.DataFrame(resp.data)
+async def fetch_user_feature(user_id: str) -> Dict:
+    if missing_feature_cache.get(user_id):
+        raise FeatureNotFound(f"user_feature not found for user_id={user_id}")
+    with span("supabase_feature", kind=SPAN_KIND_CLIENT):
+        feature = await feature_cache.aget_or_load(user_id, lambda: _load_user_feature(user_id))
+    if feature is None:
+        missing_feature_cache.set(user_id, True)
+        raise FeatureNotFound(f"user_feature not found for user_id={user_id}")
+    return feature
+
+
+async def default_predict_result(
+    *, gender: Optional[str] = None, age_band: Optional[str] = None
+) -> Optional[Dict]:
+    return await segment_default(await _db(), "club", gender=gender, age_band=age_band)
+
+
+def _benefit_frame(rows: List[Dict[str, Any]]) -> pd.DataFrame:
+    df = pd.DataFrame(rows)
+    df.attrs["version"] = fingerprint(rows)
+    return df
+
+
+async def _fetch_benefit_rows() -> List[Dict[str, Any]]:
+    rows = await afetch_rows(
+        await _db(),
+        "benefit_labeled",
+        key=BENEFIT_KEY_COLUMN,
+        page_size=BENEFIT_PAGE_SIZE,
+        workers=BENEFIT_FETCH_WORKERS,
+    )
+    await aremember("catalog", "benefit_labeled", rows)
+    return rows
+
+
+async def _load_benefits() -> pd.DataFrame:
+    return await run_in_threadpool(_benefit_frame, await _fetch_benefit_rows())
+
+
+async def _publish_benefits() -> SharedTable:
+    # The fetch runs on the event loop; only the file write goes to a worker
+    # thread, so nothing holding the publish lock waits on the loop.
+    lock = await run_in_threadpool(SHARED_BENEFITS.acquire)
+    try:
+        table = SHARED_BENEFITS.current()
+        if table is not None and not SHARED_BENEFITS.is_stale(table):
+            return table
+        rows = await _fetch_benefit_rows()
+
+        def publish() -> SharedTable:
+            return SHARED_BENEFITS.publish(rows, version=fingerprint(rows))
+
+        return await run_in_threadpool(publish)
+    finally:
+        SHARED_BENEFITS.release(lock)
+
+
+def _log_refresh_error(refresh: "asyncio.Future[SharedTable]") -> None:
+    if not refresh.cancelled() and refresh.exception() is not None:
+        logger.error("benefit catalog refresh failed", exc_info=refresh.exception())
+
+
+async def _shared_benefits() -> SharedTable:
+    table = SHARED_BENEFITS.current()
+    if table is None:
+        with span("supabase_benefits", kind=SPAN_KIND_CLIENT):
+            return await _benefits_publish.do("benefit_labeled", _publish_benefits)
+    if SHARED_BENEFITS.is_stale(table):
+        # Serve the mapped version while one refresh runs in the background,
+        # outside this request's deadline and trace.
+        refresh = contextvars.Context().run(
+            _benefits_publish.start, "benefit_labeled", _publish_benefits
+        )
+        refresh.add_done_callback(_log_refresh_error)
+    return table
+
+
+async def fetch_benefits() -> Union[SharedTable, pd.DataFrame]:
+    if SHARED_BENEFITS is not None:
+        return await _shared_benefits()
+    with span("supabase_benefits", kind=SPAN_KIND_CLIENT):
+        return await catalog_cache.aget_or_load("benefit_labeled", _load_benefits)
+
+
+def benefit_records(benefits: Union[SharedTable, pd.DataFrame]) -> List[Dict[str, Any]]:
+    with span("serialize"):
+        if isinstance(benefits, SharedTable):
+            return benefits.records()
+        return benefits.replace({np.nan: None}).to_dict(orient="records")
 
 
-def call_predict_api(*, user_id: str, segment_id: str, uuid_id: str) -> Optional[Dict]:
-    feature = fetch_user_feature(user_id)
+def catalog_version(benefits: Union[SharedTable, pd.DataFrame]) -> str:
+    if isinstance(benefits, SharedTable):
+        return benefits.version
+    return benefits.attrs.get("version", "")
+
+
+async def build_predict_input(*, user_id: str, segment_id: str = "") -> Dict[str, Any]:
+    feature = await fetch_user_feature(user_id)
     clean_feature = {
         k: (None if isinstance(v, float) and np.isnan(v) else v)
         for k, v in feature.items()
     }
     clean_feature["user_id"] = user_id
-    clean_feature["segment_id"] = segment_id
-
-    benefit_df = fetch_benefits().replace({np.nan: None})
-    payload = {
-        "paths": ["dummy"],
-        "config": {
-            "input_data": clean_feature,
-            "uuid_id": uuid_id,
-            "benefits": benefit_df.to_dict(orient="records"),
-        },
-    }
+    clean_feature["segment_id"] = (
+        segment_id
+        or feature.get("segment_id")
+        or segment_id_for(feature.get("gender"), feature.get("age_band"))
+    )
+    return clean_feature
 
-    r = requests.post(
-        PREDICT_API_URL,
-        json=payload,
-        headers=_predict_headers(),
-        timeout=60,
+
+async def _predict_inputs(
+    *, user_id: str, segment_id: str = ""
+) -> Tuple[Dict[str, Any], Union[SharedTable, pd.DataFrame]]:
+    return await asyncio.gather(
+        build_predict_input(user_id=user_id, segment_id=segment_id), fetch_benefits()
     )
+
+
+async def predict_etag(*, user_id: str, segment_id: str = "") -> str:
+    clean_feature, benefits = await _predict_inputs(user_id=user_id, segment_id=segment_id)
+    return etag_for(clean_feature, catalog_version(benefits))
+
+
+def _post_predict(
+    *, clean_feature: Dict[str, Any], uuid_id: str, benefits: Union[SharedTable, pd.DataFrame]
+) -> requests.Response:
+    records = benefit_records(benefits)
+    with span("serialize"):
+        payload = {
+            "paths": ["dummy"],
+            "config": {"input_data": clean_feature, "uuid_id": uuid_id, "benefits": records},
+        }
+        data = orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY)
+
+    with PREDICT_LIMITER.slot(), span("upstream", kind=SPAN_KIND_CLIENT):
+        r = PREDICT_UPSTREAM.post(
+            get_http(),
+            data=data,
+            headers=propagate(_predict_headers()),
+            timeout=deadline_timeout(60),
+        )
     if r.status_code != 200:
         raise RuntimeError(f"Predict API error: status={r.status_code}, body={r.text}")
-    return r.json()
+    return r
+
+
+async def _predict_body(*, user_id: str, segment_id: str = "", uuid_id: str) -> bytes:
+    clean_feature, benefits = await _predict_inputs(user_id=user_id, segment_id=segment_id)
+    post = functools.partial(
+        run_in_threadpool,
+        _post_predict,
+        clean_feature=clean_feature,
+        uuid_id=uuid_id,
+        benefits=benefits,
+    )
+    if PREDICT_MEMO_CACHE is None:
+        return (await post()).content
+
+    key = PREDICT_MEMO_CACHE.key(clean_feature, catalog_version(benefits))
+    cached = PREDICT_MEMO_CACHE.get(key)
+    if cached is not None and not PREDICT_MEMO_CACHE.should_verify():
+        return await run_in_threadpool(
+            PREDICT_MEMO_CACHE.personalize, cached, user_id=user_id, uuid_id=uuid_id
+        )
+
+    body = (await post()).content
+    if cached is not None:
+        await run_in_threadpool(PREDICT_MEMO_CACHE.record_drift, cached, body)
+    PREDICT_MEMO_CACHE.set(key, body)
+    return body
+
+
+async def call_predict_api(*, user_id: str, segment_id: str = "", uuid_id: str) -> Optional[Dict]:
+    body = await call_predict_api_raw(user_id=user_id, segment_id=segment_id, uuid_id=uuid_id)
+    return orjson.loads(body)
+
+
+async def call_predict_api_raw(*, user_id: str, segment_id: str = "", uuid_id: str) -> bytes:
+    body, _ = await fetch_predict_body(user_id=user_id, segment_id=segment_id, uuid_id=uuid_id)
+    return body
+
+
+async def fetch_predict_body(
+    *, user_id: str, segment_id: str = "", uuid_id: str
+) -> Tuple[bytes, bool]:
+    # The flag is False when the body is the last-good fallback, which must
+    # not be served under the ETag of the current inputs.
+    try:
+        body = await _predict_body(user_id=user_id, segment_id=segment_id, uuid_id=uuid_id)
+    except (RuntimeError, requests.RequestException, HTTPException, DeadlineExceeded):
+        last_good = await arecall("predict", user_id)
+        if last_good is None:
+            raise
+        return last_good, False
+    await aremember("predict", user_id, body)
+    OFFER_INDEX.update(user_id, body)
+    return body, True
+
+
+def club_offers(user_id: str) -> Optional[ClubOffers]:
+    offers = OFFER_INDEX.get(user_id)
+    if offers is None:
+        last_good = recall("predict", user_id)
+        if last_good is not None:
+            OFFER_INDEX.update(user_id, last_good)
+            offers = OFFER_INDEX.get(user_id)
+    return offers
+
+
+warm_once("feature", feature_cache)
+warm_once("catalog", catalog_cache, decode=lambda b: _benefit_frame(orjson.loads(b)))
@@ -1,16 +1,24 @@
 # app.py
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
+import sys
 import uuid
+from pathlib import Path
 
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from shared.profiling import ProfiledRoute, admin_router
 from supabase_client import (
     call_predict_api,
     save_user_club,
     leave_user_club
 )
 
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse)
+app.router.route_class = ProfiledRoute
+app.include_router(admin_router)
 
 # 🔥 개발용 CORS (나중에 도메인 제한 가능)
 app.add_middleware(
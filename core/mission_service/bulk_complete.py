@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+import argparse
+import gzip
+import itertools
+import os
+import sys
+import time
+from typing import Any, Dict, Iterator, List
+
+import orjson
+import requests
+
+
+def _batches(path: str, size: int) -> Iterator[List[bytes]]:
+    opener = gzip.open if path.endswith(".gz") else open
+    with sys.stdin.buffer if path == "-" else opener(path, "rb") as f:
+        while True:
+            batch = list(itertools.islice(f, size))
+            if not batch:
+                return
+            yield batch
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Stream NDJSON mission completions to /missions/complete/bulk"
+    )
+    parser.add_argument("path", help="NDJSON file (.gz ok) or - for stdin")
+    parser.add_argument("--url", default=os.getenv("MISSION_SERVICE_URL", "http://localhost:8000"))
+    parser.add_argument("--api-key", default=os.getenv("API_KEY"))
+    parser.add_argument("--batch-lines", type=int, default=50_000)
+    parser.add_argument("--failed-out", help="write failed rows here as NDJSON")
+    args = parser.parse_args()
+
+    session = requests.Session()
+    totals: Dict[str, Any] = {"records": 0, "groups": 0, "upserted": 0}
+    failed: List[Dict[str, Any]] = []
+    exclusions_failed: List[Dict[str, Any]] = []
+    start = time.monotonic()
+    offset = 0
+    for batch in _batches(args.path, args.batch_lines):
+        r = session.post(
+            f"{args.url.rstrip('/')}/missions/complete/bulk",
+            data=b"".join(line if line.endswith(b"\n") else line + b"\n" for line in batch),
+            headers={"Content-Type": "application/x-ndjson", "x-api-key": args.api_key or ""},
+            timeout=600,
+        )
+        r.raise_for_status()
+        report = r.json()
+        for key in totals:
+            totals[key] += report[key]
+        for row in report["failed"]:
+            if "line" in row:
+                row["line"] += offset
+            failed.append(row)
+        exclusions_failed.extend(report.get("exclusions_failed", []))
+        offset += len(batch)
+        elapsed = time.monotonic() - start
+        print(
+            f"{totals['records']:>10} records {totals['upserted']:>10} upserted "
+            f"{len(failed):>6} failed {totals['records'] / elapsed:>10.1f} rec/s",
+            file=sys.stderr,
+        )
+
+    if args.failed_out:
+        with open(args.failed_out, "wb") as f:
+            f.write(b"".join(orjson.dumps(row) + b"\n" for row in failed))
+            f.write(
+                b"".join(
+                    orjson.dumps({**row, "stage": "exclusions"}) + b"\n"
+                    for row in exclusions_failed
+                )
+            )
+    elapsed = time.monotonic() - start
+    totals.update(
+        failed=len(failed),
+        exclusions_failed=len(exclusions_failed),
+        elapsed_sec=round(elapsed, 3),
+        records_per_sec=round(totals["records"] / elapsed, 1) if elapsed > 0 else None,
+    )
+    print(orjson.dumps(totals).decode())
+    sys.exit(1 if failed or exclusions_failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,61 @@
 from __future__ import annotations
 
+import asyncio
 import os
+import sys
+import time
 from datetime import date, datetime, timedelta, timezone
-from typing import Any, Dict, List, Optional, Union
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
 
 import numpy as np
+import orjson
 import requests
 from dotenv import load_dotenv
-from fastapi import FastAPI, Header, HTTPException
+from fastapi import APIRouter, FastAPI, Header, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, Response
 from pydantic import BaseModel
-from supabase import create_client
+from supabase import AsyncClient
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from payloads import build_mission_payloads
+from ranker import LocalRanker
+from shared import queries
+from shared.admission import limiter_from_env, rate_limiter_from_env
+from shared.cache import feature_cache
+from shared.capture import install_capture
+from shared.clients import get_async_supabase, get_http, supabase_lifespan
+from shared.cold_start import (
+    FeatureNotFound,
+    missing_feature_cache,
+    segment_default,
+    segment_id_for,
+)
+from shared.deadline import DeadlineExceeded, DeadlineRoute, propagate
+from shared.deadline import timeout as deadline_timeout
+from shared.disk_cache import aremember, arecall, warm_once
+from shared.etag import DEGRADED_HEADERS, etag_for, etag_matches
+from shared.idempotency import run_idempotent
+from shared.profiling import admin_router, run_in_threadpool
+from shared.queries import EXCLUSION_TABLE
+from shared.tracing import SPAN_KIND_CLIENT, span
+from shared.upstream import upstream_from_env
 
 load_dotenv()
 
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse, lifespan=supabase_lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=False,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "Server-Timing"],
 )
+install_capture(app)
+router = APIRouter(route_class=DeadlineRoute)
 
 
 def _required_env(name: str) -> str:
@@ -36,8 +70,22 @@ SUPABASE_URL = _required_env("SUPABASE_URL")
 SUPABASE_SERVICE_KEY = _required_env("SUPABASE_SERVICE_KEY")
 MISSION_API_URL = _required_env("MISSION_API_URL")
 MISSION_API_KEY = _required_env("MISSION_API_KEY")
-
-sb = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
+MISSION_PASSTHROUGH = os.getenv("MISSION_PASSTHROUGH", "1") == "1"
+LOCAL_RANKER_PATH = os.getenv("LOCAL_RANKER_PATH")
+LOCAL_RANKER_MODE = os.getenv("LOCAL_RANKER_MODE", "fallback")
+if LOCAL_RANKER_MODE not in ("primary", "fallback", "shadow"):
+    raise RuntimeError(
+        f"LOCAL_RANKER_MODE must be primary, fallback or shadow, got {LOCAL_RANKER_MODE!r}"
+    )
+EXCLUSION_RETENTION_DAYS = int(os.getenv("EXCLUSION_RETENTION_DAYS", "30"))
+BULK_CHUNK_USERS = int(os.getenv("BULK_CHUNK_USERS", "200"))
+BULK_PAGE_SIZE = int(os.getenv("BULK_PAGE_SIZE", "1000"))
+
+MISSION_LIMITER = limiter_from_env("MISSION")
+MISSION_RATE_LIMITER = rate_limiter_from_env("MISSION")
+MISSION_UPSTREAM = upstream_from_env("MISSION", MISSION_API_URL)
+LOCAL_RANKER = LocalRanker.load(LOCAL_RANKER_PATH) if LOCAL_RANKER_PATH else None
+warm_once("feature", feature_cache)
 KST = timezone(timedelta(hours=9))
 
 
@@ -63,6 +111,29 @@ def _to_date_str(d: Union[str, date, datetime, None]) -> str:
     return str(d)
 
 
+def _iso_date(value: Any) -> str:
+    text = str(value)
+    try:
+        return date.fromisoformat(text).isoformat()
+    except ValueError:
+        pass
+    try:
+        dt = datetime.fromisoformat(text)
+    except ValueError:
+        raise ValueError(f"invalid date {value!r}") from None
+    return (dt.astimezone(KST) if dt.tzinfo else dt).date().isoformat()
+
+
+def _parse_kst(ts: Any) -> Optional[datetime]:
+    if ts is None:
+        return None
+    try:
+        dt = datetime.fromisoformat(str(ts))
+    except ValueError:
+        return None
+    return dt.replace(tzinfo=KST) if dt.tzinfo is None else dt
+
+
 def _clean_jsonable(obj: Any) -> Any:
     if obj is None:
         return None
@@ -92,24 +163,122 @@ def _unique_str_list(values: List[Any]) -> List[str]:
     return out
 
 
-def fetch_latest_user_feature(user_id: str) -> Dict[str, Any]:
-    resp = (
-        sb.table("user_feature_30d")
-        .select("*")
-        .eq("user_id", user_id)
-        .order("snapshot_date", desc=True)
-        .limit(1)
-        .execute()
-    )
+async def _db() -> AsyncClient:
+    return await get_async_supabase(SUPABASE_URL, SUPABASE_SERVICE_KEY)
+
 
+async def _load_latest_user_feature(user_id: str) -> Optional[Dict[str, Any]]:
+    sb = await _db()
+    resp = await queries.latest_feature(sb, user_id).execute()
     rows = resp.data or []
     if not rows:
-        raise ValueError(f"user_feature_30d not found for user_id={user_id}")
+        return None
+    await aremember("feature", user_id, rows[0])
+    return rows[0]
+
+
+async def fetch_latest_user_feature(user_id: str) -> Dict[str, Any]:
+    if missing_feature_cache.get(user_id):
+        raise FeatureNotFound(f"user_feature_30d not found for user_id={user_id}")
+    with span("supabase_feature", kind=SPAN_KIND_CLIENT):
+        row = await feature_cache.aget_or_load(user_id, lambda: _load_latest_user_feature(user_id))
+    if row is None:
+        missing_feature_cache.set(user_id, True)
+        raise FeatureNotFound(f"user_feature_30d not found for user_id={user_id}")
+
+    return _clean_jsonable(row)
+
+
+async def _apaged(query: Callable[[], Any]) -> List[Dict[str, Any]]:
+    # Offset paging over a stable order; stop on an empty page because
+    # PostgREST's max-rows can cap a page below BULK_PAGE_SIZE.
+    rows: List[Dict[str, Any]] = []
+    while True:
+        page = (await query().range(len(rows), len(rows) + BULK_PAGE_SIZE - 1).execute()).data
+        if not page:
+            return rows
+        rows.extend(page)
+
+
+def _merge_exclusions(
+    exclusions: Dict[str, str], mission_ids: List[str], done_at: datetime
+) -> None:
+    for mission_id in mission_ids:
+        prev = _parse_kst(exclusions.get(mission_id))
+        if prev is None or prev < done_at:
+            exclusions[mission_id] = done_at.isoformat()
+
+
+def _prune_exclusions(exclusions: Dict[str, str], cutoff: datetime) -> Dict[str, str]:
+    kept: Dict[str, str] = {}
+    for mission_id, ts in exclusions.items():
+        parsed = _parse_kst(ts)
+        if parsed is not None and parsed >= cutoff:
+            kept[mission_id] = ts
+    return kept
+
+
+def _collect_exclusions(
+    rows: List[Dict[str, Any]], user_ids: List[str]
+) -> Dict[str, Dict[str, str]]:
+    exclusions: Dict[str, Dict[str, str]] = {u: {} for u in user_ids}
+    for r in rows:
+        ex = r.get("exclude_mission_ids")
+        ids = _unique_str_list(ex if isinstance(ex, list) else [ex])
+        done_at = _parse_kst(r.get("completed_at"))
+        if done_at is None:
+            continue
+        _merge_exclusions(exclusions.setdefault(r["user_id"], {}), ids, done_at)
+    return exclusions
+
+
+async def _scan_exclusions_many(
+    user_ids: List[str], *, since: datetime
+) -> Dict[str, Dict[str, str]]:
+    sb = await _db()
+    rows = await _apaged(lambda: queries.completed_missions(sb, user_ids, since))
+    return _collect_exclusions(rows, user_ids)
+
 
-    return _clean_jsonable(rows[0])
+async def _scan_exclusions(user_id: str, *, since: datetime) -> Dict[str, str]:
+    return (await _scan_exclusions_many([user_id], since=since))[user_id]
+
+
+async def _load_exclusion_summary(user_id: str) -> Optional[Dict[str, str]]:
+    sb = await _db()
+    resp = await queries.exclusion_summary(sb, user_id).execute()
+    rows = resp.data or []
+    if not rows:
+        return None
+    return dict(rows[0].get("exclusions") or {})
 
 
-def fetch_exclude_mission_ids_last_7d(
+async def _update_exclusion_summary(
+    user_id: str,
+    mission_ids: List[str],
+    completed_at: str,
+    *,
+    now_kst: Optional[datetime] = None,
+) -> Dict[str, str]:
+    now_kst = now_kst or _now_kst()
+    cutoff = now_kst - timedelta(days=EXCLUSION_RETENTION_DAYS)
+    done_at = _parse_kst(completed_at) or now_kst
+
+    summary = await _load_exclusion_summary(user_id)
+    if summary is None:
+        summary = await _scan_exclusions(user_id, since=cutoff)
+
+    _merge_exclusions(summary, mission_ids, done_at)
+    kept = _prune_exclusions(summary, cutoff)
+
+    sb = await _db()
+    await sb.table(EXCLUSION_TABLE).upsert(
+        {"user_id": user_id, "exclusions": kept, "updated_at": now_kst.isoformat()}
+    ).execute()
+    return kept
+
+
+async def fetch_exclude_mission_ids_last_7d(
     user_id: str,
     *,
     days: int = 7,
@@ -117,73 +286,132 @@ def fetch_exclude_mission_ids_last_7d(
 ) -> List[str]:
     now_kst = now_kst or _now_kst()
     start_kst = now_kst - timedelta(days=days)
-    start_iso = start_kst.isoformat()
-
-    resp = (
-        sb.table("user_mission_pool")
-        .select("exclude_mission_ids,completed_at,status")
-        .eq("user_id", user_id)
-        .eq("status", "completed")
-        .gte("completed_at", start_iso)
-        .execute()
-    )
 
-    rows = resp.data or []
-    collected: List[Any] = []
-    for r in rows:
-        ex = r.get("exclude_mission_ids")
-        if isinstance(ex, list):
-            collected.extend(ex)
-        elif ex is not None:
-            collected.append(ex)
+    summary = await _load_exclusion_summary(user_id) if days <= EXCLUSION_RETENTION_DAYS else None
+    if summary is None:
+        summary = await _scan_exclusions(user_id, since=start_kst)
+
+    collected: List[str] = []
+    for mission_id, ts in summary.items():
+        done_at = _parse_kst(ts)
+        if done_at is not None and done_at >= start_kst:
+            collected.append(mission_id)
 
     return _unique_str_list(collected)
 
 
-def call_mission_api(
+async def _exclusions_span(user_id: str, days: int) -> List[str]:
+    with span("supabase_exclusions", kind=SPAN_KIND_CLIENT):
+        return await fetch_exclude_mission_ids_last_7d(user_id, days=days)
+
+
+async def build_mission_input(*, user_id: str, k: int = 3, exclude_days: int = 7) -> Dict[str, Any]:
+    feature, exclude_ids = await asyncio.gather(
+        fetch_latest_user_feature(user_id), _exclusions_span(user_id, exclude_days)
+    )
+
+    row = dict(
+        feature,
+        user_id=feature.get("user_id") or user_id,
+        segment_id=feature.get("segment_id")
+        or segment_id_for(feature.get("gender"), feature.get("age_band")),
+    )
+    return build_mission_payloads([row], k=k, exclude_ids={row["user_id"]: exclude_ids})[0]
+
+
+def _post_mission(payload_input: Dict[str, Any], *, timeout_sec: int = 60) -> requests.Response:
+    with span("serialize"):
+        data = orjson.dumps(payload_input)
+    with MISSION_LIMITER.slot(), span("upstream", kind=SPAN_KIND_CLIENT):
+        r = MISSION_UPSTREAM.post(
+            get_http(),
+            data=data,
+            headers=propagate(_mission_headers()),
+            timeout=deadline_timeout(timeout_sec),
+        )
+
+    if r.status_code != 200:
+        raise RuntimeError(f"Mission API error: status={r.status_code}, body={r.text}")
+
+    return r
+
+
+async def call_mission_api(
     *,
     user_id: str,
     k: int = 3,
     exclude_days: int = 7,
     timeout_sec: int = 60,
 ) -> Dict[str, Any]:
-    feature = fetch_latest_user_feature(user_id)
-
-    exclude_ids = fetch_exclude_mission_ids_last_7d(user_id, days=exclude_days)
-
-    payload_input = {
-        "user_id": feature.get("user_id") or user_id,
-        "segment_id": feature.get("segment_id"),
-        "gender": feature.get("gender"),
-        "age_band": feature.get("age_band"),
-        "channel_mobile_share": feature.get("channel_mobile_share", 0.0),
-        "channel_online_share": feature.get("channel_online_share", 0.0),
-        "channel_offline_share": feature.get("channel_offline_share", 0.0),
-        "domain_beauty_share": feature.get("domain_beauty_share", 0.0),
-        "domain_food_share": feature.get("domain_food_share", 0.0),
-        "domain_entertainment_share": feature.get("domain_entertainment_share", 0.0),
-        "domain_commerce_share": feature.get("domain_commerce_share", 0.0),
-        "domain_general_share": feature.get("domain_general_share", 0.0),
-        "avg_amount": feature.get("avg_amount", 0.0),
-        "use_ratio": feature.get("use_ratio", 0.0),
-        "k": int(k),
-        "exclude_mission_ids": exclude_ids,
-    }
-
-    r = requests.post(
-        MISSION_API_URL,
-        json=_clean_jsonable(payload_input),
-        headers=_mission_headers(),
-        timeout=timeout_sec,
+    return orjson.loads(
+        await call_mission_api_raw(
+            user_id=user_id, k=k, exclude_days=exclude_days, timeout_sec=timeout_sec
+        )
     )
 
-    if r.status_code != 200:
-        raise RuntimeError(f"Mission API error: status={r.status_code}, body={r.text}")
 
-    return r.json()
+async def call_mission_api_raw(
+    *,
+    user_id: str,
+    k: int = 3,
+    exclude_days: int = 7,
+    timeout_sec: int = 60,
+) -> bytes:
+    payload_input = await build_mission_input(user_id=user_id, k=k, exclude_days=exclude_days)
+    r = await run_in_threadpool(_post_mission, payload_input, timeout_sec=timeout_sec)
+    return r.content
+
+
+async def recommend_missions(
+    *,
+    user_id: str,
+    k: int = 3,
+    exclude_days: int = 7,
+    timeout_sec: int = 60,
+    payload_input: Optional[Dict[str, Any]] = None,
+) -> Union[Dict[str, Any], bytes]:
+    result, _ = await recommend_missions_with_source(
+        user_id=user_id,
+        k=k,
+        exclude_days=exclude_days,
+        timeout_sec=timeout_sec,
+        payload_input=payload_input,
+    )
+    return result
 
 
-def save_mission_completion(
+async def recommend_missions_with_source(
+    *,
+    user_id: str,
+    k: int = 3,
+    exclude_days: int = 7,
+    timeout_sec: int = 60,
+    payload_input: Optional[Dict[str, Any]] = None,
+) -> Tuple[Union[Dict[str, Any], bytes], bool]:
+    # The flag is False for the fallback ranker and the last-good body, which
+    # must not be served under the ETag of the current inputs.
+    if payload_input is None:
+        payload_input = await build_mission_input(user_id=user_id, k=k, exclude_days=exclude_days)
+    if LOCAL_RANKER is not None and LOCAL_RANKER_MODE == "primary":
+        return await run_in_threadpool(LOCAL_RANKER.recommend, payload_input), True
+
+    try:
+        r = await run_in_threadpool(_post_mission, payload_input, timeout_sec=timeout_sec)
+    except (RuntimeError, requests.RequestException, HTTPException, DeadlineExceeded):
+        if LOCAL_RANKER is not None and LOCAL_RANKER_MODE == "fallback":
+            return await run_in_threadpool(LOCAL_RANKER.recommend, payload_input), False
+        last_good = await arecall("mission", f"{user_id}:{k}")
+        if last_good is None:
+            raise
+        return (last_good if MISSION_PASSTHROUGH else orjson.loads(last_good)), False
+
+    await aremember("mission", f"{user_id}:{k}", r.content)
+    if LOCAL_RANKER is not None and LOCAL_RANKER_MODE == "shadow":
+        LOCAL_RANKER.compare_in_background(payload_input, r.content)
+    return (r.content if MISSION_PASSTHROUGH else orjson.loads(r.content)), True
+
+
+async def save_mission_completion(
     *,
     user_id: str,
     date_str: Union[str, date, datetime],
@@ -194,14 +422,9 @@ def save_mission_completion(
     completed_at = completed_at or _now_kst_str()
     add_ids = _unique_str_list(completed_mission_ids)
 
-    existing = (
-        sb.table("user_mission_pool")
-        .select("exclude_mission_ids")
-        .eq("user_id", user_id)
-        .eq("date", d)
-        .limit(1)
-        .execute()
-    )
+    sb = await _db()
+    with span("supabase_pool", kind=SPAN_KIND_CLIENT):
+        existing = await queries.pool_row(sb, user_id, d).execute()
 
     prev_ids: List[str] = []
     rows = existing.data or []
@@ -222,10 +445,161 @@ def save_mission_completion(
         "completed_at": completed_at,
     }
 
-    res = sb.table("user_mission_pool").upsert(upsert_row).execute()
+    with span("supabase_pool", kind=SPAN_KIND_CLIENT):
+        res = await (
+            sb.table("user_mission_pool")
+            .upsert(upsert_row, on_conflict=queries.MISSION_POOL_CONFLICT)
+            .execute()
+        )
+    with span("supabase_exclusions", kind=SPAN_KIND_CLIENT):
+        await _update_exclusion_summary(user_id, add_ids, completed_at)
     return {"saved": upsert_row, "supabase": res.data}
 
 
+Completion = Dict[str, Any]
+
+
+def _group_completions(
+    lines: Iterable[bytes],
+) -> Tuple[int, Dict[Tuple[str, str], Completion], List[Dict[str, Any]]]:
+    groups: Dict[Tuple[str, str], Completion] = {}
+    failed: List[Dict[str, Any]] = []
+    count = 0
+    for lineno, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        count += 1
+        try:
+            rec = orjson.loads(line)
+            user_id = str(rec["user_id"]).strip()
+            # Normalized so every spelling of a day lands in the same (user_id, date) row.
+            d = _iso_date(rec["date"] if "date" in rec else rec["date_str"])
+            ids = rec.get("mission_ids", rec.get("completed_mission_ids"))
+            if not user_id or not isinstance(ids, list):
+                raise ValueError("user_id and a mission_ids list are required")
+        except KeyError as exc:
+            failed.append({"line": lineno, "error": f"missing field {exc}"})
+            continue
+        except (orjson.JSONDecodeError, TypeError, ValueError) as exc:
+            failed.append({"line": lineno, "error": str(exc)})
+            continue
+
+        group = groups.setdefault((user_id, d), {"mission_ids": [], "completed_at": None})
+        group["mission_ids"] = _unique_str_list(group["mission_ids"] + ids)
+        done_at = _parse_kst(rec.get("completed_at"))
+        prev = _parse_kst(group["completed_at"])
+        if done_at is not None and (prev is None or prev < done_at):
+            group["completed_at"] = rec["completed_at"]
+    return count, groups, failed
+
+
+def _later(a: Optional[str], b: Optional[str]) -> Optional[str]:
+    pa, pb = _parse_kst(a), _parse_kst(b)
+    if pa is None or pb is None:
+        return b if pa is None else a
+    return a if pa >= pb else b
+
+
+async def _ingest_pool_chunk(users: List[str], by_user: Dict[str, Dict[str, Completion]]) -> int:
+    sb = await _db()
+    dates = sorted({d for u in users for d in by_user[u]})
+    existing = {
+        (r["user_id"], r["date"]): r
+        for r in await _apaged(lambda: queries.pool_rows(sb, users, dates))
+    }
+
+    pool_rows = []
+    for user_id in users:
+        for d, group in by_user[user_id].items():
+            row = existing.get((user_id, d)) or {}
+            ex = row.get("exclude_mission_ids")
+            prev_ids = _unique_str_list(ex if isinstance(ex, list) else [ex])
+            # Backfilled events must not move a stored completion time backwards.
+            completed_at = _later(row.get("completed_at"), group["completed_at"])
+            pool_rows.append(
+                {
+                    "user_id": user_id,
+                    "date": d,
+                    "exclude_mission_ids": _unique_str_list(prev_ids + group["mission_ids"]),
+                    "status": "completed",
+                    "completed_at": completed_at or _now_kst_str(),
+                }
+            )
+    await sb.table("user_mission_pool").upsert(
+        pool_rows, on_conflict=queries.MISSION_POOL_CONFLICT
+    ).execute()
+    return len(pool_rows)
+
+
+async def _ingest_exclusions_chunk(
+    users: List[str], by_user: Dict[str, Dict[str, Completion]]
+) -> None:
+    sb = await _db()
+    now_kst = _now_kst()
+    cutoff = now_kst - timedelta(days=EXCLUSION_RETENTION_DAYS)
+    summaries = {
+        r["user_id"]: dict(r.get("exclusions") or {})
+        for r in await _apaged(lambda: queries.exclusion_summaries(sb, users))
+    }
+    missing = [u for u in users if u not in summaries]
+    if missing:
+        summaries.update(await _scan_exclusions_many(missing, since=cutoff))
+
+    summary_rows = []
+    for user_id in users:
+        summary = summaries[user_id]
+        for group in by_user[user_id].values():
+            done_at = _parse_kst(group["completed_at"]) or now_kst
+            _merge_exclusions(summary, group["mission_ids"], done_at)
+        summary_rows.append(
+            {
+                "user_id": user_id,
+                "exclusions": _prune_exclusions(summary, cutoff),
+                "updated_at": now_kst.isoformat(),
+            }
+        )
+    await sb.table(EXCLUSION_TABLE).upsert(summary_rows).execute()
+
+
+async def ingest_completions(lines: Iterable[bytes]) -> Dict[str, Any]:
+    start = time.monotonic()
+    count, groups, failed = await run_in_threadpool(_group_completions, lines)
+
+    by_user: Dict[str, Dict[str, Completion]] = {}
+    for (user_id, d), group in groups.items():
+        by_user.setdefault(user_id, {})[d] = group
+
+    users = list(by_user)
+    upserted = 0
+    exclusions_failed: List[Dict[str, Any]] = []
+    for i in range(0, len(users), BULK_CHUNK_USERS):
+        chunk = users[i : i + BULK_CHUNK_USERS]
+        try:
+            upserted += await _ingest_pool_chunk(chunk, by_user)
+        except Exception as exc:
+            failed.extend(
+                {"user_id": u, "date": d, "error": str(exc)} for u in chunk for d in by_user[u]
+            )
+            continue
+        # Pool rows are written at this point; a summary failure only leaves
+        # the exclusion cache stale, and re-sending these users is safe.
+        try:
+            await _ingest_exclusions_chunk(chunk, by_user)
+        except Exception as exc:
+            exclusions_failed.extend({"user_id": u, "error": str(exc)} for u in chunk)
+
+    elapsed = time.monotonic() - start
+    return {
+        "records": count,
+        "groups": len(groups),
+        "upserted": upserted,
+        "failed": failed,
+        "exclusions_failed": exclusions_failed,
+        "elapsed_sec": round(elapsed, 3),
+        "records_per_sec": round(count / elapsed, 1) if elapsed > 0 else None,
+    }
+
+
 def _check_api_key(x_api_key: Optional[str]):
     if x_api_key != API_KEY:
         raise HTTPException(status_code=403, detail="Unauthorized")
@@ -235,6 +609,8 @@ class RecommendRequest(BaseModel):
     user_id: str
     k: int = 3
     exclude_days: int = 7
+    gender: Optional[str] = None
+    age_band: Optional[str] = None
 
 
 class CompleteRequest(BaseModel):
@@ -249,18 +625,100 @@ def health():
     return {"ok": True}
 
 
-@app.post("/missions/recommend")
-def missions_recommend(req: RecommendRequest, x_api_key: str = Header(None)):
+async def _segment_default_or_404(gender: Optional[str], age_band: Optional[str]) -> Dict[str, Any]:
+    result = await segment_default(await _db(), "mission", gender=gender, age_band=age_band)
+    if result is None:
+        raise HTTPException(status_code=404, detail="No features or segment default for user")
+    return result
+
+
+@router.post("/missions/recommend")
+async def missions_recommend(req: RecommendRequest, x_api_key: str = Header(None)):
     _check_api_key(x_api_key)
-    return call_mission_api(user_id=req.user_id, k=req.k, exclude_days=req.exclude_days)
+    MISSION_RATE_LIMITER.check(req.user_id)
+    try:
+        result = await recommend_missions(
+            user_id=req.user_id, k=req.k, exclude_days=req.exclude_days
+        )
+    except FeatureNotFound:
+        return await _segment_default_or_404(req.gender, req.age_band)
+    if isinstance(result, bytes):
+        return Response(content=result, media_type="application/json")
+    return result
+
+
+@router.get("/missions/recommend")
+async def missions_recommend_get(
+    user_id: str,
+    k: int = 3,
+    exclude_days: int = 7,
+    gender: Optional[str] = None,
+    age_band: Optional[str] = None,
+    x_api_key: str = Header(None),
+    if_none_match: Optional[str] = Header(None),
+):
+    _check_api_key(x_api_key)
+    try:
+        payload_input = await build_mission_input(user_id=user_id, k=k, exclude_days=exclude_days)
+    except FeatureNotFound:
+        return await _segment_default_or_404(gender, age_band)
+
+    etag = etag_for(payload_input)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    MISSION_RATE_LIMITER.check(user_id)
+    result, fresh = await recommend_missions_with_source(
+        user_id=user_id, k=k, exclude_days=exclude_days, payload_input=payload_input
+    )
+    if not fresh:
+        headers = DEGRADED_HEADERS
+    if isinstance(result, bytes):
+        return Response(content=result, media_type="application/json", headers=headers)
+    return ORJSONResponse(result, headers=headers)
 
 
-@app.post("/missions/complete")
-def missions_complete(req: CompleteRequest, x_api_key: str = Header(None)):
+@router.get("/missions/ranker/stats")
+def missions_ranker_stats(x_api_key: str = Header(None)):
     _check_api_key(x_api_key)
-    return save_mission_completion(
-        user_id=req.user_id,
-        date_str=req.date_str,
-        completed_mission_ids=req.completed_mission_ids,
-        completed_at=req.completed_at,
+    if LOCAL_RANKER is None:
+        raise HTTPException(status_code=404, detail="Local ranker is not loaded")
+    return {"mode": LOCAL_RANKER_MODE, **LOCAL_RANKER.stats()}
+
+
+@router.post("/missions/complete/bulk")
+async def missions_complete_bulk(request: Request, x_api_key: str = Header(None)):
+    _check_api_key(x_api_key)
+    body = await request.body()
+    return await ingest_completions(body.splitlines())
+
+
+@router.get("/missions/upstream/stats")
+def missions_upstream_stats(x_api_key: str = Header(None)):
+    _check_api_key(x_api_key)
+    return MISSION_UPSTREAM.stats()
+
+
+@router.post("/missions/complete")
+async def missions_complete(
+    req: CompleteRequest,
+    x_api_key: str = Header(None),
+    idempotency_key: Optional[str] = Header(None),
+):
+    _check_api_key(x_api_key)
+    return await run_idempotent(
+        f"missions/complete:{req.user_id}",
+        idempotency_key,
+        req.model_dump(),
+        lambda: save_mission_completion(
+            user_id=req.user_id,
+            date_str=req.date_str,
+            completed_mission_ids=req.completed_mission_ids,
+            completed_at=req.completed_at,
+        ),
     )
+
+
+app.include_router(router)
+app.include_router(admin_router)
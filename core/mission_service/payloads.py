@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+from typing import Any, Dict, List, Mapping, Optional, Sequence
+
+import numpy as np
+
+CATEGORICAL_FIELDS = ("segment_id", "gender", "age_band")
+CHANNEL_SHARE_FIELDS = (
+    "channel_mobile_share",
+    "channel_online_share",
+    "channel_offline_share",
+)
+DOMAIN_SHARE_FIELDS = (
+    "domain_beauty_share",
+    "domain_food_share",
+    "domain_entertainment_share",
+    "domain_commerce_share",
+    "domain_general_share",
+)
+NUMERIC_FIELDS = CHANNEL_SHARE_FIELDS + DOMAIN_SHARE_FIELDS + ("avg_amount", "use_ratio")
+
+
+def _column(rows: Sequence[Mapping[str, Any]], field: str) -> np.ndarray:
+    # dtype=float turns None into NaN, so one nan_to_num covers missing and NaN.
+    try:
+        col = np.array([r.get(field) for r in rows], dtype=np.float64)
+    except (TypeError, ValueError):
+        col = np.array([_to_float(r.get(field)) for r in rows], dtype=np.float64)
+    return np.nan_to_num(col, nan=0.0, posinf=0.0, neginf=0.0)
+
+
+def _to_float(v: Any) -> float:
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _categorical(rows: Sequence[Mapping[str, Any]], field: str) -> List[Any]:
+    out: List[Any] = []
+    for r in rows:
+        v = r.get(field)
+        if v is None or (isinstance(v, float) and v != v):
+            out.append(None)
+        else:
+            out.append(v)
+    return out
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    totals = matrix.sum(axis=1, keepdims=True)
+    return np.divide(matrix, totals, out=np.zeros_like(matrix), where=totals > 0)
+
+
+def feature_matrix(
+    rows: Sequence[Mapping[str, Any]],
+    *,
+    normalize_shares: bool = False,
+) -> np.ndarray:
+    if not rows:
+        return np.zeros((0, len(NUMERIC_FIELDS)))
+    matrix = np.column_stack([_column(rows, f) for f in NUMERIC_FIELDS])
+    if normalize_shares:
+        n_channel = len(CHANNEL_SHARE_FIELDS)
+        n_domain = len(DOMAIN_SHARE_FIELDS)
+        matrix[:, :n_channel] = _normalize(matrix[:, :n_channel])
+        matrix[:, n_channel : n_channel + n_domain] = _normalize(
+            matrix[:, n_channel : n_channel + n_domain]
+        )
+    return matrix
+
+
+def build_mission_payloads(
+    rows: Sequence[Mapping[str, Any]],
+    *,
+    k: int = 3,
+    exclude_ids: Optional[Mapping[str, List[str]]] = None,
+    normalize_shares: bool = False,
+) -> List[Dict[str, Any]]:
+    exclude_ids = exclude_ids or {}
+    user_ids = _categorical(rows, "user_id")
+    categoricals = {f: _categorical(rows, f) for f in CATEGORICAL_FIELDS}
+    numeric = feature_matrix(rows, normalize_shares=normalize_shares).T.tolist()
+
+    payloads: List[Dict[str, Any]] = []
+    for i, user_id in enumerate(user_ids):
+        payload: Dict[str, Any] = {"user_id": user_id}
+        for f in CATEGORICAL_FIELDS:
+            payload[f] = categoricals[f][i]
+        for j, f in enumerate(NUMERIC_FIELDS):
+            payload[f] = numeric[j][i]
+        payload["k"] = int(k)
+        payload["exclude_mission_ids"] = list(exclude_ids.get(user_id, []))
+        payloads.append(payload)
+    return payloads
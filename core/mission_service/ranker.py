@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Mapping, Optional
+
+import numpy as np
+import orjson
+
+from payloads import NUMERIC_FIELDS, feature_matrix
+
+logger = logging.getLogger(__name__)
+
+RANKER_SHADOW_BACKLOG = int(os.getenv("RANKER_SHADOW_BACKLOG", "256"))
+
+
+class LocalRanker:
+    def __init__(
+        self,
+        *,
+        mission_ids: np.ndarray,
+        vectors: np.ndarray,
+        bias: Optional[np.ndarray] = None,
+        feature_mean: Optional[np.ndarray] = None,
+        feature_std: Optional[np.ndarray] = None,
+        normalize_shares: bool = False,
+        missions: Optional[Dict[str, Dict[str, Any]]] = None,
+    ) -> None:
+        if vectors.shape != (len(mission_ids), len(NUMERIC_FIELDS)):
+            raise ValueError(
+                f"vectors must be ({len(mission_ids)}, {len(NUMERIC_FIELDS)}), got {vectors.shape}"
+            )
+        self.mission_ids = [str(m) for m in mission_ids]
+        self.vectors = np.ascontiguousarray(vectors, dtype=np.float64)
+        self.bias = np.zeros(len(mission_ids)) if bias is None else bias.astype(np.float64)
+        self.feature_mean = feature_mean
+        self.feature_std = feature_std
+        self.normalize_shares = normalize_shares
+        self.missions = missions or {}
+        self._index = {m: i for i, m in enumerate(self.mission_ids)}
+        self._lock = threading.Lock()
+        self.shadow_requests = 0
+        self.shadow_overlap = 0.0
+        self.shadow_dropped = 0
+        self._shadow_pending = 0
+        self._shadow_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ranker-shadow")
+
+    @classmethod
+    def load(cls, path: str) -> "LocalRanker":
+        with np.load(path, allow_pickle=False) as f:
+            missions = orjson.loads(str(f["missions_json"])) if "missions_json" in f else None
+            return cls(
+                mission_ids=f["mission_ids"],
+                vectors=f["vectors"],
+                bias=f["bias"] if "bias" in f else None,
+                feature_mean=f["feature_mean"] if "feature_mean" in f else None,
+                feature_std=f["feature_std"] if "feature_std" in f else None,
+                normalize_shares=bool(f["normalize_shares"]) if "normalize_shares" in f else False,
+                missions=missions,
+            )
+
+    def scores(self, payload_input: Mapping[str, Any]) -> np.ndarray:
+        x = feature_matrix([payload_input], normalize_shares=self.normalize_shares)[0]
+        if self.feature_mean is not None:
+            x = x - self.feature_mean
+        if self.feature_std is not None:
+            x = x / np.where(self.feature_std > 0, self.feature_std, 1.0)
+        return self.vectors @ x + self.bias
+
+    def top_k(self, payload_input: Mapping[str, Any]) -> List[Dict[str, Any]]:
+        k = int(payload_input.get("k") or 3)
+        scores = self.scores(payload_input)
+        excluded = [
+            self._index[m] for m in payload_input.get("exclude_mission_ids") or [] if m in self._index
+        ]
+        if excluded:
+            scores[excluded] = -np.inf
+
+        k = min(k, len(scores) - len(excluded))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        results: List[Dict[str, Any]] = []
+        for i in top:
+            mission_id = self.mission_ids[i]
+            results.append(
+                {**self.missions.get(mission_id, {}), "mission_id": mission_id, "score": float(scores[i])}
+            )
+        return results
+
+    def recommend(self, payload_input: Mapping[str, Any]) -> Dict[str, Any]:
+        return {"source": "local", "data": {"results": self.top_k(payload_input)}}
+
+    def compare(self, payload_input: Mapping[str, Any], remote: Mapping[str, Any]) -> float:
+        results = (remote.get("data") or {}).get("results") or []
+        remote_ids = [str(m.get("mission_id", m.get("id"))) for m in results if isinstance(m, dict)]
+        local_ids = [m["mission_id"] for m in self.top_k(payload_input)]
+        overlap = len(set(remote_ids) & set(local_ids)) / len(remote_ids) if remote_ids else 1.0
+
+        with self._lock:
+            self.shadow_requests += 1
+            self.shadow_overlap += overlap
+        logger.info(
+            "mission ranker shadow user_id=%s overlap=%.2f remote=%s local=%s",
+            payload_input.get("user_id"),
+            overlap,
+            remote_ids,
+            local_ids,
+        )
+        return overlap
+
+    def compare_in_background(self, payload_input: Mapping[str, Any], remote_body: bytes) -> None:
+        # Shadow scoring never delays the live response; when the worker falls
+        # behind, comparisons are dropped rather than queued without bound.
+        with self._lock:
+            if self._shadow_pending >= RANKER_SHADOW_BACKLOG:
+                self.shadow_dropped += 1
+                return
+            self._shadow_pending += 1
+        self._shadow_pool.submit(self._shadow_compare, payload_input, remote_body)
+
+    def _shadow_compare(self, payload_input: Mapping[str, Any], remote_body: bytes) -> None:
+        try:
+            self.compare(payload_input, orjson.loads(remote_body))
+        except Exception:
+            logger.exception("mission ranker shadow compare failed")
+        finally:
+            with self._lock:
+                self._shadow_pending -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            n = self.shadow_requests
+            return {
+                "missions": len(self.mission_ids),
+                "shadow_requests": n,
+                "shadow_mean_overlap": self.shadow_overlap / n if n else None,
+                "shadow_dropped": self.shadow_dropped,
+            }
@@ -0,0 +1,226 @@
+from __future__ import annotations
+
+import argparse
+import os
+import sqlite3
+import sys
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import orjson
+from dotenv import load_dotenv
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from payloads import CATEGORICAL_FIELDS, NUMERIC_FIELDS, feature_matrix
+from shared import queries
+from shared.clients import get_supabase
+from shared.etag import fingerprint
+from shared.queries import EXCLUSION_TABLE
+
+load_dotenv()
+
+RECOMPUTE_FEATURE_THRESHOLD = float(os.getenv("RECOMPUTE_FEATURE_THRESHOLD", "0.05"))
+RECOMPUTE_STATE_PATH = os.getenv("RECOMPUTE_STATE_PATH", "recompute_state.sqlite")
+RECOMPUTE_QUEUE_TABLE = os.getenv("RECOMPUTE_QUEUE_TABLE", "recompute_queue")
+PAGE_SIZE = int(os.getenv("RECOMPUTE_PAGE_SIZE", "1000"))
+# Matches the recommender's default exclude_days window.
+RECOMPUTE_EXCLUDE_DAYS = int(os.getenv("RECOMPUTE_EXCLUDE_DAYS", "7"))
+KST = timezone(timedelta(hours=9))
+
+Row = Dict[str, Any]
+
+
+def _scan(sb: Any, table: str, columns: str, **eq: Any) -> Iterator[Row]:
+    after: Optional[str] = None
+    while True:
+        q = queries.keyset_page(sb, table, columns, after=after, page_size=PAGE_SIZE, **eq)
+        rows = q.execute().data or []
+        if not rows:
+            return
+        yield from rows
+        after = rows[-1]["user_id"]
+
+
+def previous_snapshot_date(sb: Any, snapshot_date: str) -> Optional[str]:
+    rows = queries.previous_snapshot(sb, snapshot_date).execute().data or []
+    return rows[0]["snapshot_date"] if rows else None
+
+
+def _snapshot(sb: Any, snapshot_date: Optional[str]) -> Tuple[List[str], np.ndarray, List[tuple]]:
+    if snapshot_date is None:
+        return [], np.zeros((0, len(NUMERIC_FIELDS))), []
+    columns = ",".join(("user_id",) + CATEGORICAL_FIELDS + NUMERIC_FIELDS)
+    rows = list(_scan(sb, "user_feature_30d", columns, snapshot_date=snapshot_date))
+    categoricals = [tuple(r.get(f) for f in CATEGORICAL_FIELDS) for r in rows]
+    return [str(r["user_id"]) for r in rows], feature_matrix(rows), categoricals
+
+
+def active_exclusions(exclusions: Dict[str, Any], since: datetime) -> List[str]:
+    active = []
+    for mission_id, ts in exclusions.items():
+        try:
+            done_at = datetime.fromisoformat(str(ts))
+        except ValueError:
+            continue
+        if (done_at if done_at.tzinfo else done_at.replace(tzinfo=KST)) >= since:
+            active.append(mission_id)
+    return sorted(active)
+
+
+def feature_deltas(prev: np.ndarray, curr: np.ndarray) -> np.ndarray:
+    # Shares live in [0, 1] and compare absolutely; amounts compare relatively.
+    scale = np.maximum(1.0, np.maximum(np.abs(prev), np.abs(curr)))
+    return (np.abs(curr - prev) / scale).max(axis=1, initial=0.0)
+
+
+class RecomputeState:
+    def __init__(self, path: str) -> None:
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS recompute_state ("
+            " user_id TEXT PRIMARY KEY, club_fp TEXT, exclusions_fp TEXT)"
+        )
+
+    def load(self) -> Dict[str, Tuple[Optional[str], Optional[str]]]:
+        rows = self.conn.execute("SELECT user_id, club_fp, exclusions_fp FROM recompute_state")
+        return {user_id: (club_fp, exclusions_fp) for user_id, club_fp, exclusions_fp in rows}
+
+    def save(self, changed: Dict[str, Tuple[Optional[str], Optional[str]]]) -> None:
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO recompute_state (user_id, club_fp, exclusions_fp)"
+                " VALUES (?, ?, ?)",
+                [(user_id, club_fp, ex_fp) for user_id, (club_fp, ex_fp) in changed.items()],
+            )
+
+
+def detect_changes(
+    sb: Any,
+    snapshot_date: str,
+    *,
+    threshold: float,
+    state: RecomputeState,
+    exclude_days: int = RECOMPUTE_EXCLUDE_DAYS,
+) -> Tuple[List[Row], Dict[str, Any], Dict[str, Tuple[Optional[str], Optional[str]]]]:
+    prev_date = previous_snapshot_date(sb, snapshot_date)
+    users, curr, curr_cat = _snapshot(sb, snapshot_date)
+    prev_users, prev, prev_cat = _snapshot(sb, prev_date)
+
+    reasons: Dict[str, List[str]] = {}
+    deltas: Dict[str, float] = {}
+
+    prev_index = {u: i for i, u in enumerate(prev_users)}
+    matched = np.array([prev_index.get(u, -1) for u in users], dtype=np.int64)
+    seen = matched >= 0
+    delta = np.full(len(users), np.inf)
+    delta[seen] = feature_deltas(prev[matched[seen]], curr[seen])
+    for i, user_id in enumerate(users):
+        if not seen[i]:
+            reasons.setdefault(user_id, []).append("new_user")
+            continue
+        if delta[i] > threshold:
+            reasons.setdefault(user_id, []).append("features")
+            deltas[user_id] = float(delta[i])
+        if curr_cat[i] != prev_cat[matched[i]]:
+            reasons.setdefault(user_id, []).append("segment")
+
+    # Club and exclusion changes are tracked against the fingerprints of the
+    # previous run, since neither table keeps history. Exclusions are taken
+    # over the window the recommender applies, so a mission aging out of it
+    # re-queues the user too.
+    last = state.load()
+    since = datetime.fromisoformat(snapshot_date).replace(tzinfo=KST) - timedelta(days=exclude_days)
+    clubs = {
+        str(r["user_id"]): fingerprint(r.get("club_domain"), r.get("status"))
+        for r in _scan(sb, "user_selected_club", "user_id,club_domain,status")
+    }
+    exclusions = {
+        str(r["user_id"]): fingerprint(active_exclusions(r.get("exclusions") or {}, since))
+        for r in _scan(sb, EXCLUSION_TABLE, "user_id,exclusions")
+    }
+    changed: Dict[str, Tuple[Optional[str], Optional[str]]] = {}
+    for user_id in set(clubs) | set(exclusions) | set(last):
+        club_fp, ex_fp = clubs.get(user_id), exclusions.get(user_id)
+        last_club, last_ex = last.get(user_id, (None, None))
+        if club_fp != last_club:
+            reasons.setdefault(user_id, []).append("club")
+        if ex_fp != last_ex:
+            reasons.setdefault(user_id, []).append("exclusions")
+        if (club_fp, ex_fp) != (last_club, last_ex):
+            changed[user_id] = (club_fp, ex_fp)
+
+    queued = [
+        {
+            "user_id": user_id,
+            "snapshot_date": snapshot_date,
+            "reasons": user_reasons,
+            "max_delta": deltas.get(user_id),
+        }
+        for user_id, user_reasons in sorted(reasons.items())
+    ]
+    by_reason = Counter(reason for row in queued for reason in row["reasons"])
+    report = {
+        "snapshot_date": snapshot_date,
+        "previous_snapshot_date": prev_date,
+        "threshold": threshold,
+        "users": len(users),
+        "queued": len(queued),
+        "churn": round(len(queued) / len(users), 4) if users else None,
+        "by_reason": dict(by_reason),
+    }
+    return queued, report, changed
+
+
+def enqueue(sb: Any, queued: List[Row], *, chunk_size: int = 500) -> None:
+    queued_at = datetime.now(tz=timezone.utc).isoformat()
+    for i in range(0, len(queued), chunk_size):
+        rows = [{**row, "queued_at": queued_at} for row in queued[i : i + chunk_size]]
+        sb.table(RECOMPUTE_QUEUE_TABLE).upsert(rows).execute()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Queue users whose features, exclusions or club changed for re-scoring"
+    )
+    parser.add_argument("snapshot_date", help="the user_feature_30d snapshot that just landed")
+    parser.add_argument("--threshold", type=float, default=RECOMPUTE_FEATURE_THRESHOLD)
+    parser.add_argument("--exclude-days", type=int, default=RECOMPUTE_EXCLUDE_DAYS)
+    parser.add_argument("--state", default=RECOMPUTE_STATE_PATH)
+    parser.add_argument("--out", help="write queued users as NDJSON (default: stdout)")
+    parser.add_argument(
+        "--enqueue", action="store_true", help=f"upsert into {RECOMPUTE_QUEUE_TABLE}"
+    )
+    parser.add_argument("--dry-run", action="store_true", help="do not update the state file")
+    args = parser.parse_args()
+
+    sb = get_supabase(os.environ["SUPABASE_URL"], os.environ["SUPABASE_SERVICE_KEY"])
+    state = RecomputeState(args.state)
+    queued, report, changed = detect_changes(
+        sb,
+        args.snapshot_date,
+        threshold=args.threshold,
+        state=state,
+        exclude_days=args.exclude_days,
+    )
+    lines = b"".join(orjson.dumps(row) + b"\n" for row in queued)
+    if args.out:
+        with open(args.out, "wb") as f:
+            f.write(lines)
+    else:
+        sys.stdout.buffer.write(lines)
+        sys.stdout.buffer.flush()
+    if not args.dry_run:
+        if args.enqueue:
+            enqueue(sb, queued)
+        # Fingerprints advance only once the queued users have been handed off,
+        # so a failed enqueue or write is picked up again on the next run.
+        state.save(changed)
+    print(orjson.dumps(report).decode(), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
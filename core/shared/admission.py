@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Iterator, Optional, Tuple
+
+from fastapi import HTTPException
+
+from shared.deadline import expired as deadline_expired
+from shared.deadline import timeout as deadline_timeout
+
+
+class ConcurrencyLimiter:
+    def __init__(
+        self,
+        *,
+        limit: int,
+        queue_timeout_sec: float,
+        adaptive: bool = False,
+        min_limit: int = 1,
+        max_limit: Optional[int] = None,
+        latency_target_sec: float = 2.0,
+        backoff: float = 0.9,
+    ) -> None:
+        self.queue_timeout_sec = queue_timeout_sec
+        self.adaptive = adaptive
+        self.min_limit = min_limit
+        self.max_limit = max_limit or limit * 4
+        self.latency_target_sec = latency_target_sec
+        self.backoff = backoff
+        self._limit = float(limit)
+        self._in_flight = 0
+        self._cond = threading.Condition()
+
+    @property
+    def limit(self) -> int:
+        return max(self.min_limit, int(self._limit))
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def acquire(self) -> None:
+        deadline = time.monotonic() + deadline_timeout(self.queue_timeout_sec)
+        with self._cond:
+            while self._in_flight >= self.limit:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise HTTPException(
+                        status_code=503,
+                        detail="Upstream is at capacity",
+                        headers={"Retry-After": "1"},
+                    )
+                self._cond.wait(remaining)
+            self._in_flight += 1
+
+    def release(self, latency_sec: Optional[float], *, sample: bool = True) -> None:
+        with self._cond:
+            self._in_flight -= 1
+            if self.adaptive and sample:
+                if latency_sec is not None and latency_sec <= self.latency_target_sec:
+                    self._limit = min(float(self.max_limit), self._limit + 1.0 / self._limit)
+                else:
+                    self._limit = max(float(self.min_limit), self._limit * self.backoff)
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        self.acquire()
+        start = time.monotonic()
+        latency: Optional[float] = None
+        sample = False
+        try:
+            yield
+            latency = time.monotonic() - start
+            sample = True
+        except Exception:
+            # Timing out against the caller's own deadline is not a congestion
+            # signal; only upstream failures back the limit off.
+            sample = not deadline_expired()
+            raise
+        finally:
+            self.release(latency, sample=sample)
+
+
+class UserRateLimiter:
+    def __init__(self, *, rate_per_sec: float, burst: float, max_users: int = 100_000) -> None:
+        self.rate_per_sec = rate_per_sec
+        self.burst = burst
+        self.max_users = max_users
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def check(self, user_id: str) -> None:
+        if self.rate_per_sec <= 0:
+            return
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.pop(user_id, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated_at) * self.rate_per_sec)
+            allowed = tokens >= 1.0
+            if allowed:
+                tokens -= 1.0
+            self._buckets[user_id] = (tokens, now)
+            while len(self._buckets) > self.max_users:
+                self._buckets.popitem(last=False)
+        if not allowed:
+            retry_after = max(1, int((1.0 - tokens) / self.rate_per_sec + 0.999))
+            raise HTTPException(
+                status_code=429,
+                detail="Too many requests",
+                headers={"Retry-After": str(retry_after)},
+            )
+
+
+def limiter_from_env(prefix: str) -> ConcurrencyLimiter:
+    return ConcurrencyLimiter(
+        limit=int(os.getenv(f"{prefix}_MAX_CONCURRENCY", "16")),
+        queue_timeout_sec=float(os.getenv(f"{prefix}_QUEUE_TIMEOUT_SEC", "2")),
+        adaptive=os.getenv(f"{prefix}_ADAPTIVE_LIMIT", "0") == "1",
+        latency_target_sec=float(os.getenv(f"{prefix}_LATENCY_TARGET_SEC", "2")),
+    )
+
+
+def rate_limiter_from_env(prefix: str) -> UserRateLimiter:
+    return UserRateLimiter(
+        rate_per_sec=float(os.getenv(f"{prefix}_USER_RATE_PER_SEC", "1")),
+        burst=float(os.getenv(f"{prefix}_USER_RATE_BURST", "5")),
+    )
@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+
+class SingleFlight:
+    def __init__(self) -> None:
+        self._pending: Dict[Hashable, "asyncio.Future[Any]"] = {}
+
+    async def _run(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            return await fn()
+        finally:
+            self._pending.pop(key, None)
+
+    def start(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> "asyncio.Future[Any]":
+        pending = self._pending.get(key)
+        if pending is None:
+            pending = self._pending[key] = asyncio.ensure_future(self._run(key, fn))
+        return pending
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        # The shield keeps a cancelled caller from aborting the call for the rest.
+        return await asyncio.shield(self.start(key, fn))
+
+
+class TTLCache:
+    def __init__(self, *, ttl_sec: float, maxsize: int = 10_000) -> None:
+        self.ttl_sec = ttl_sec
+        self.maxsize = maxsize
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._loading = SingleFlight()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl_sec, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        value = self.get(key)
+        if value is None:
+            value = loader()
+            if value is not None:
+                self.set(key, value)
+        return value
+
+    async def aget_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        async def load() -> Any:
+            value = await loader()
+            if value is not None:
+                self.set(key, value)
+            return value
+
+        # Concurrent misses for a key wait on one load instead of each running it.
+        return await self._loading.do(key, load)
+
+
+feature_cache = TTLCache(
+    ttl_sec=float(os.getenv("FEATURE_CACHE_TTL_SEC", "600")),
+    maxsize=int(os.getenv("FEATURE_CACHE_MAXSIZE", "50000")),
+)
+catalog_cache = TTLCache(ttl_sec=float(os.getenv("CATALOG_CACHE_TTL_SEC", "300")), maxsize=4)
@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+import gzip
+import hashlib
+import hmac
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qsl, urlencode
+
+import orjson
+from fastapi import FastAPI
+
+logger = logging.getLogger(__name__)
+
+CAPTURE_PATH = os.getenv("CAPTURE_PATH")
+CAPTURE_SAMPLE_RATE = float(os.getenv("CAPTURE_SAMPLE_RATE", "1"))
+CAPTURE_SALT = os.getenv("CAPTURE_SALT", "")
+CAPTURE_QUEUE_MAX = int(os.getenv("CAPTURE_QUEUE_MAX", "10000"))
+CAPTURE_ROUTES = {"/predict", "/select_club", "/missions/recommend", "/missions/complete"}
+CAPTURE_HEADERS = {b"content-type", b"if-none-match", b"idempotency-key"}
+CAPTURE_MAX_BODY = 64 * 1024
+
+
+def pseudonymize(user_id: Any) -> str:
+    digest = hmac.new(CAPTURE_SALT.encode(), str(user_id).encode(), hashlib.sha256)
+    return "u_" + digest.hexdigest()[:16]
+
+
+def _sanitize_body(body: bytes) -> Any:
+    if not body:
+        return None
+    try:
+        data = orjson.loads(body)
+    except orjson.JSONDecodeError:
+        return None
+    if isinstance(data, dict) and "user_id" in data:
+        data["user_id"] = pseudonymize(data["user_id"])
+    return data
+
+
+def _sanitize_query(query: bytes) -> str:
+    params = [
+        (k, pseudonymize(v) if k == "user_id" else v)
+        for k, v in parse_qsl(query.decode("latin-1"), keep_blank_values=True)
+    ]
+    return urlencode(params)
+
+
+class _Writer:
+    def __init__(self, path: str, *, maxsize: int) -> None:
+        self.path = path
+        self.dropped = 0
+        self._queue: "queue.Queue[bytes]" = queue.Queue(maxsize=maxsize)
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def submit(self, record: Dict[str, Any]) -> None:
+        try:
+            self._queue.put_nowait(orjson.dumps(record) + b"\n")
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped % 1000 == 1:
+                logger.warning("capture queue full; %d records dropped", self.dropped)
+
+    def _run(self) -> None:
+        opener = gzip.open if self.path.endswith(".gz") else open
+        while True:
+            lines = [self._queue.get()]
+            while True:
+                try:
+                    lines.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                with opener(self.path, "ab") as f:
+                    f.write(b"".join(lines))
+            except Exception:
+                logger.exception("failed to write %d capture records to %s", len(lines), self.path)
+
+
+class CaptureMiddleware:
+    def __init__(
+        self, app: Any, *, path: str, sample_rate: float = 1.0, queue_max: int = CAPTURE_QUEUE_MAX
+    ) -> None:
+        self.app = app
+        self.sample_rate = sample_rate
+        self.writer = _Writer(path, maxsize=queue_max)
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if (
+            scope["type"] != "http"
+            or scope["path"] not in CAPTURE_ROUTES
+            or random.random() >= self.sample_rate
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        body: List[bytes] = []
+        response: Dict[str, Any] = {"status": 0, "bytes": 0}
+        digest = hashlib.blake2b(digest_size=8)
+
+        async def capture_receive() -> Dict[str, Any]:
+            message = await receive()
+            if message["type"] == "http.request" and sum(map(len, body)) < CAPTURE_MAX_BODY:
+                body.append(message.get("body", b""))
+            return message
+
+        async def capture_send(message: Dict[str, Any]) -> None:
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+            elif message["type"] == "http.response.body":
+                chunk = message.get("body", b"")
+                response["bytes"] += len(chunk)
+                digest.update(chunk)
+            await send(message)
+
+        try:
+            await self.app(scope, capture_receive, capture_send)
+        finally:
+            self.writer.submit(
+                {
+                    "ts": time.time(),
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "query": _sanitize_query(scope.get("query_string", b"")),
+                    "headers": {
+                        k.decode(): v.decode("latin-1")
+                        for k, v in scope["headers"]
+                        if k in CAPTURE_HEADERS
+                    },
+                    "body": _sanitize_body(b"".join(body)),
+                    "status": response["status"],
+                    "bytes": response["bytes"],
+                    "digest": digest.hexdigest(),
+                    "duration_ms": round((time.perf_counter() - start) * 1000, 3),
+                }
+            )
+
+
+def install_capture(app: FastAPI, path: Optional[str] = CAPTURE_PATH) -> None:
+    if path:
+        # Without a secret key, HMAC pseudonyms of sequential user ids can be
+        # reversed by enumeration, so captures would not be pseudonymized.
+        if not CAPTURE_SALT:
+            raise RuntimeError("CAPTURE_SALT must be set when CAPTURE_PATH is set")
+        app.add_middleware(CaptureMiddleware, path=path, sample_rate=CAPTURE_SAMPLE_RATE)
@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import os
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from typing import AsyncIterator, Dict, Optional, Tuple
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from supabase import (
+    AsyncClient,
+    AsyncClientOptions,
+    Client,
+    ClientOptions,
+    acreate_client,
+    create_client,
+)
+
+from shared.deadline import AsyncDeadlineTransport, DeadlineTransport
+
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "32"))
+SUPABASE_TIMEOUT_SEC = float(os.getenv("SUPABASE_TIMEOUT_SEC", "120"))
+SUPABASE_HTTP2 = os.getenv("SUPABASE_HTTP2", "1") == "1"
+SUPABASE_MAX_CONNECTIONS = int(os.getenv("SUPABASE_MAX_CONNECTIONS", "100"))
+SUPABASE_MAX_KEEPALIVE = int(os.getenv("SUPABASE_MAX_KEEPALIVE", "20"))
+SUPABASE_KEEPALIVE_SEC = float(os.getenv("SUPABASE_KEEPALIVE_SEC", "30"))
+
+_async_http: Optional[httpx.AsyncClient] = None
+_async_clients: Dict[Tuple[str, str], AsyncClient] = {}
+
+
+@lru_cache(maxsize=None)
+def get_supabase(url: str, key: str) -> Client:
+    # Every query is capped by the current request's deadline, if any.
+    http = httpx.Client(transport=DeadlineTransport(), timeout=SUPABASE_TIMEOUT_SEC)
+    return create_client(url, key, options=ClientOptions(httpx_client=http))
+
+
+async def start_async_supabase() -> None:
+    global _async_http
+    if _async_http is not None:
+        return
+    transport = httpx.AsyncHTTPTransport(
+        http2=SUPABASE_HTTP2,
+        limits=httpx.Limits(
+            max_connections=SUPABASE_MAX_CONNECTIONS,
+            max_keepalive_connections=SUPABASE_MAX_KEEPALIVE,
+            keepalive_expiry=SUPABASE_KEEPALIVE_SEC,
+        ),
+    )
+    _async_http = httpx.AsyncClient(
+        transport=AsyncDeadlineTransport(transport), timeout=SUPABASE_TIMEOUT_SEC
+    )
+
+
+async def close_async_supabase() -> None:
+    global _async_http
+    if _async_http is not None:
+        await _async_http.aclose()
+    _async_http = None
+    _async_clients.clear()
+
+
+async def get_async_supabase(url: str, key: str) -> AsyncClient:
+    if _async_http is None:
+        raise RuntimeError("async Supabase transport is not started; run the app lifespan")
+    client = _async_clients.get((url, key))
+    if client is None:
+        options = AsyncClientOptions(httpx_client=_async_http)
+        client = _async_clients[(url, key)] = await acreate_client(url, key, options=options)
+    return client
+
+
+@asynccontextmanager
+async def supabase_lifespan(app) -> AsyncIterator[None]:
+    # One pooled HTTP/2 transport per process, shared by every service router
+    # mounted in this app.
+    await start_async_supabase()
+    try:
+        yield
+    finally:
+        await close_async_supabase()
+
+
+@lru_cache(maxsize=None)
+def get_http() -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=8, pool_maxsize=HTTP_POOL_MAXSIZE)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
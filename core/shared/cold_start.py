@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+import os
+from typing import Any, Dict, Optional, Tuple
+
+from supabase import AsyncClient
+
+from shared.cache import TTLCache
+
+SEGMENT_DEFAULTS_TABLE = os.getenv("SEGMENT_DEFAULTS_TABLE", "segment_default_recommendation")
+
+missing_feature_cache = TTLCache(
+    ttl_sec=float(os.getenv("MISSING_FEATURE_TTL_SEC", "300")),
+    maxsize=int(os.getenv("MISSING_FEATURE_MAXSIZE", "100000")),
+)
+segment_defaults_cache = TTLCache(
+    ttl_sec=float(os.getenv("SEGMENT_DEFAULTS_TTL_SEC", "3600")), maxsize=1
+)
+
+
+class FeatureNotFound(ValueError):
+    pass
+
+
+def segment_id_for(gender: Optional[str], age_band: Optional[str]) -> str:
+    if not gender or not age_band:
+        return ""
+    return f"{gender}_{age_band}"
+
+
+async def _load_segment_defaults(sb: AsyncClient) -> Dict[Tuple[str, str], Dict[str, Any]]:
+    resp = await sb.table(SEGMENT_DEFAULTS_TABLE).select("*").execute()
+    defaults: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    for r in resp.data or []:
+        defaults[(r.get("gender") or "*", r.get("age_band") or "*")] = r
+    return defaults
+
+
+async def segment_default(
+    sb: AsyncClient,
+    kind: str,
+    *,
+    gender: Optional[str] = None,
+    age_band: Optional[str] = None,
+) -> Optional[Dict[str, Any]]:
+    defaults = await segment_defaults_cache.aget_or_load("all", lambda: _load_segment_defaults(sb))
+    gender = gender or "*"
+    age_band = age_band or "*"
+    for key in ((gender, age_band), (gender, "*"), ("*", age_band), ("*", "*")):
+        result = (defaults.get(key) or {}).get(f"{kind}_result")
+        if result is not None:
+            return {**result, "source": "segment_default"}
+    return None
@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, Optional
+
+import httpx
+import requests
+from fastapi import Request, Response
+from fastapi.responses import ORJSONResponse
+
+from shared.tracing import TracedRoute
+
+DEADLINE_HEADER = os.getenv("DEADLINE_HEADER", "x-request-timeout-ms")
+DEADLINE_DEFAULT_SEC = float(os.getenv("DEADLINE_DEFAULT_SEC", "30"))
+# Comma-separated path=seconds overrides; bulk ingest needs far longer than a page view.
+DEADLINE_ROUTES = os.getenv("DEADLINE_ROUTES", "/missions/complete/bulk=900")
+
+_deadline: ContextVar[Optional[float]] = ContextVar("deadline", default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+def _parse_routes(spec: str) -> Dict[str, float]:
+    routes: Dict[str, float] = {}
+    for item in spec.split(","):
+        path, _, seconds = item.strip().partition("=")
+        if path and seconds:
+            routes[path] = float(seconds)
+    return routes
+
+
+ROUTE_DEADLINES = _parse_routes(DEADLINE_ROUTES)
+
+
+def remaining() -> Optional[float]:
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    left = deadline - time.monotonic()
+    if left <= 0:
+        raise DeadlineExceeded("request deadline exhausted")
+    return left
+
+
+def expired() -> bool:
+    deadline = _deadline.get()
+    return deadline is not None and deadline <= time.monotonic()
+
+
+def timeout(default: float) -> float:
+    left = remaining()
+    return default if left is None else min(default, left)
+
+
+def propagate(headers: Dict[str, str]) -> Dict[str, str]:
+    left = remaining()
+    if left is None:
+        return headers
+    return {**headers, DEADLINE_HEADER: str(int(left * 1000))}
+
+
+@contextmanager
+def deadline_scope(seconds: float) -> Iterator[None]:
+    deadline = time.monotonic() + seconds
+    outer = _deadline.get()
+    token = _deadline.set(deadline if outer is None else min(outer, deadline))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def _client_budget(request: Request) -> Optional[float]:
+    value = request.headers.get(DEADLINE_HEADER)
+    try:
+        return float(value) / 1000 if value else None
+    except ValueError:
+        return None
+
+
+def _cap_timeouts(request: httpx.Request) -> None:
+    left = remaining()
+    if left is not None:
+        timeouts = request.extensions.get("timeout") or {}
+        request.extensions["timeout"] = {
+            k: left if timeouts.get(k) is None else min(timeouts[k], left)
+            for k in ("connect", "read", "write", "pool")
+        }
+
+
+class DeadlineTransport(httpx.BaseTransport):
+    def __init__(self, transport: Optional[httpx.BaseTransport] = None) -> None:
+        self._transport = transport or httpx.HTTPTransport()
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        _cap_timeouts(request)
+        return self._transport.handle_request(request)
+
+    def close(self) -> None:
+        self._transport.close()
+
+
+class AsyncDeadlineTransport(httpx.AsyncBaseTransport):
+    def __init__(self, transport: Optional[httpx.AsyncBaseTransport] = None) -> None:
+        self._transport = transport or httpx.AsyncHTTPTransport()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        _cap_timeouts(request)
+        return await self._transport.handle_async_request(request)
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+class DeadlineRoute(TracedRoute):
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+        route_default = ROUTE_DEADLINES.get(self.path, DEADLINE_DEFAULT_SEC)
+
+        async def deadline_handler(request: Request) -> Response:
+            budget = _client_budget(request)
+            # A client can tighten the route's deadline but never extend it.
+            seconds = route_default if budget is None else min(budget, route_default)
+            with deadline_scope(seconds):
+                try:
+                    return await handler(request)
+                except (DeadlineExceeded, requests.Timeout, httpx.TimeoutException):
+                    if not expired():
+                        raise
+                    return ORJSONResponse(
+                        {"detail": "Deadline exceeded"},
+                        status_code=504,
+                    )
+
+        return deadline_handler
@@ -0,0 +1,155 @@
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+from typing import Any, Callable, Iterator, Optional, Set, Tuple
+
+import orjson
+
+from shared.cache import TTLCache
+from shared.profiling import run_in_threadpool
+
+DISK_CACHE_PATH = os.getenv("DISK_CACHE_PATH")
+DISK_CACHE_TTL_SEC = float(os.getenv("DISK_CACHE_TTL_SEC", "86400"))
+DISK_CACHE_MAX_MB = int(os.getenv("DISK_CACHE_MAX_MB", "256"))
+DISK_CACHE_EVICT_EVERY = 64
+
+
+class DiskCache:
+    def __init__(self, path: str, *, max_bytes: int, mmap_bytes: int = 256 * 1024 * 1024) -> None:
+        self.path = path
+        self.max_bytes = max_bytes
+        self.mmap_bytes = mmap_bytes
+        self._local = threading.local()
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._conn().execute(
+            "CREATE TABLE IF NOT EXISTS cache_entry ("
+            " namespace TEXT NOT NULL,"
+            " key TEXT NOT NULL,"
+            " value BLOB NOT NULL,"
+            " expires_at REAL NOT NULL,"
+            " PRIMARY KEY (namespace, key))"
+        )
+        self._conn().execute(
+            "CREATE INDEX IF NOT EXISTS cache_entry_expires_at ON cache_entry (expires_at)"
+        )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA mmap_size={int(self.mmap_bytes)}")
+            self._local.conn = conn
+        return conn
+
+    def get(self, namespace: str, key: str) -> Optional[bytes]:
+        row = (
+            self._conn()
+            .execute(
+                "SELECT value FROM cache_entry WHERE namespace = ? AND key = ? AND expires_at >= ?",
+                (namespace, key, time.time()),
+            )
+            .fetchone()
+        )
+        return bytes(row[0]) if row else None
+
+    def set(self, namespace: str, key: str, value: bytes, *, ttl_sec: float) -> None:
+        self._conn().execute(
+            "INSERT OR REPLACE INTO cache_entry (namespace, key, value, expires_at)"
+            " VALUES (?, ?, ?, ?)",
+            (namespace, key, value, time.time() + ttl_sec),
+        )
+        with self._lock:
+            self._writes += 1
+            evict = self._writes % DISK_CACHE_EVICT_EVERY == 0
+        if evict:
+            self.evict()
+
+    def items(self, namespace: str) -> Iterator[Tuple[str, bytes]]:
+        rows = self._conn().execute(
+            "SELECT key, value FROM cache_entry WHERE namespace = ? AND expires_at >= ?",
+            (namespace, time.time()),
+        )
+        for key, value in rows:
+            yield key, bytes(value)
+
+    def evict(self) -> None:
+        conn = self._conn()
+        conn.execute("DELETE FROM cache_entry WHERE expires_at < ?", (time.time(),))
+        (total,) = conn.execute("SELECT COALESCE(SUM(LENGTH(value)), 0) FROM cache_entry").fetchone()
+        if total <= self.max_bytes:
+            return
+
+        excess = total - self.max_bytes
+        doomed = []
+        for namespace, key, size in conn.execute(
+            "SELECT namespace, key, LENGTH(value) FROM cache_entry ORDER BY expires_at"
+        ):
+            doomed.append((namespace, key))
+            excess -= size
+            if excess <= 0:
+                break
+        conn.executemany("DELETE FROM cache_entry WHERE namespace = ? AND key = ?", doomed)
+
+
+@lru_cache(maxsize=None)
+def get_disk_cache() -> Optional[DiskCache]:
+    if not DISK_CACHE_PATH:
+        return None
+    return DiskCache(DISK_CACHE_PATH, max_bytes=DISK_CACHE_MAX_MB * 1024 * 1024)
+
+
+def remember(namespace: str, key: str, value: Any) -> None:
+    disk = get_disk_cache()
+    if disk is None:
+        return
+    data = value if isinstance(value, bytes) else orjson.dumps(value)
+    disk.set(namespace, key, data, ttl_sec=DISK_CACHE_TTL_SEC)
+
+
+def recall(namespace: str, key: str) -> Optional[bytes]:
+    disk = get_disk_cache()
+    return disk.get(namespace, key) if disk is not None else None
+
+
+# SQLite writes can wait on the busy timeout and periodically run an eviction
+# scan, so the request path goes through a worker thread.
+async def aremember(namespace: str, key: str, value: Any) -> None:
+    if get_disk_cache() is not None:
+        await run_in_threadpool(remember, namespace, key, value)
+
+
+async def arecall(namespace: str, key: str) -> Optional[bytes]:
+    if get_disk_cache() is None:
+        return None
+    return await run_in_threadpool(recall, namespace, key)
+
+
+_warmed: Set[str] = set()
+_warm_lock = threading.Lock()
+
+
+def warm_once(
+    namespace: str,
+    cache: TTLCache,
+    decode: Callable[[bytes], Any] = orjson.loads,
+) -> int:
+    disk = get_disk_cache()
+    if disk is None:
+        return 0
+    with _warm_lock:
+        if namespace in _warmed:
+            return 0
+        _warmed.add(namespace)
+
+    count = 0
+    for key, value in disk.items(namespace):
+        cache.set(key, decode(value))
+        count += 1
+    return count
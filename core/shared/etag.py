@@ -0,0 +1,32 @@
+from __future__ import annotations
+
+import hashlib
+from typing import Any, Optional
+
+import orjson
+
+# Fallback bodies go out untagged and uncached so a client never revalidates
+# a degraded response against the tag of a fresh one.
+DEGRADED_HEADERS = {"Cache-Control": "no-store"}
+
+
+def fingerprint(*parts: Any) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        data = part if isinstance(part, bytes) else orjson.dumps(part, option=orjson.OPT_SORT_KEYS)
+        h.update(data)
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+def etag_for(*parts: Any) -> str:
+    return f'"{fingerprint(*parts)}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    tags = [t.strip().removeprefix("W/") for t in if_none_match.split(",")]
+    return etag in tags
@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+import asyncio
+import os
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from fastapi import HTTPException
+
+from shared.cache import TTLCache
+from shared.etag import fingerprint
+
+IDEMPOTENCY_CACHE = TTLCache(
+    ttl_sec=float(os.getenv("IDEMPOTENCY_TTL_SEC", "600")),
+    maxsize=int(os.getenv("IDEMPOTENCY_MAXSIZE", "100000")),
+)
+
+
+class _Inflight:
+    def __init__(self) -> None:
+        self.lock = asyncio.Lock()
+        self.users = 0
+
+
+_inflight: Dict[Tuple[str, str], _Inflight] = {}
+
+
+def _cached(cache_key: Tuple[str, str], body_hash: str) -> Optional[Any]:
+    cached = IDEMPOTENCY_CACHE.get(cache_key)
+    if cached is None:
+        return None
+    stored_hash, result = cached
+    if stored_hash != body_hash:
+        raise HTTPException(
+            status_code=422, detail="Idempotency-Key was already used with a different request body"
+        )
+    return result
+
+
+async def run_idempotent(
+    scope: str, key: Optional[str], body: Any, handler: Callable[[], Awaitable[Any]]
+) -> Any:
+    if not key:
+        return await handler()
+
+    cache_key = (scope, key)
+    body_hash = fingerprint(body)
+    cached = _cached(cache_key, body_hash)
+    if cached is not None:
+        return cached
+
+    # Handlers run on the event loop, so an asyncio.Lock per key is enough to
+    # collapse concurrent retries within a worker. The entry stays until the
+    # last waiter leaves, so a request arriving while a failed attempt is
+    # being retried queues behind it instead of running alongside.
+    entry = _inflight.get(cache_key)
+    if entry is None:
+        entry = _inflight[cache_key] = _Inflight()
+    entry.users += 1
+    try:
+        async with entry.lock:
+            cached = _cached(cache_key, body_hash)
+            if cached is not None:
+                return cached
+            result = await handler()
+            IDEMPOTENCY_CACHE.set(cache_key, (body_hash, result))
+            return result
+    finally:
+        entry.users -= 1
+        if entry.users == 0:
+            _inflight.pop(cache_key, None)
@@ -0,0 +1,302 @@
+from __future__ import annotations
+
+import asyncio
+import functools
+import inspect
+import os
+import random
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.concurrency import run_in_threadpool as _run_in_threadpool
+from fastapi.responses import PlainTextResponse
+from fastapi.routing import APIRoute
+from pydantic import BaseModel
+
+ADMIN_API_KEY = os.getenv("ADMIN_API_KEY")
+
+_sampled: ContextVar[bool] = ContextVar("profiler_sampled", default=False)
+
+
+def _frame_label(frame: Any) -> str:
+    code = frame.f_code
+    name = getattr(code, "co_qualname", code.co_name)
+    return f"{name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    def __init__(self) -> None:
+        self.rate = 0.0
+        self.interval_sec = 0.005
+        self.until = 0.0
+        self.samples: Counter = Counter()
+        self.sampled_requests = 0
+        # Refcounts, so overlapping sampled requests on one thread or task do
+        # not end each other's sampling.
+        self._threads: Counter = Counter()
+        self._tasks: Counter = Counter()
+        self._loops: Dict[int, asyncio.AbstractEventLoop] = {}
+        self._lock = threading.Lock()
+        self._sampler: Optional[threading.Thread] = None
+
+    @property
+    def active(self) -> bool:
+        return time.monotonic() < self.until
+
+    def start(self, *, rate: float, duration_sec: float, interval_sec: float) -> None:
+        with self._lock:
+            self.rate = max(0.0, min(1.0, rate))
+            self.interval_sec = max(0.001, interval_sec)
+            self.until = time.monotonic() + duration_sec
+            if self._sampler is None or not self._sampler.is_alive():
+                self._sampler = threading.Thread(target=self._run, daemon=True)
+                self._sampler.start()
+
+    def stop(self) -> None:
+        with self._lock:
+            self.until = 0.0
+
+    def reset(self) -> None:
+        with self._lock:
+            self.samples.clear()
+            self.sampled_requests = 0
+
+    def should_sample(self) -> bool:
+        return self.active and random.random() < self.rate
+
+    @contextmanager
+    def request(self) -> Iterator[None]:
+        with self._lock:
+            self.sampled_requests += 1
+        token = _sampled.set(True)
+        try:
+            yield
+        finally:
+            _sampled.reset(token)
+
+    @contextmanager
+    def on_thread(self) -> Iterator[None]:
+        ident = threading.get_ident()
+        with self._lock:
+            self._threads[ident] += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._threads[ident] -= 1
+                if self._threads[ident] <= 0:
+                    del self._threads[ident]
+
+    @contextmanager
+    def on_task(self) -> Iterator[None]:
+        # The loop thread runs every request's coroutines, so it is only
+        # sampled while a sampled request's task is the one running.
+        task = asyncio.current_task()
+        with self._lock:
+            self._tasks[task] += 1
+            self._loops[threading.get_ident()] = asyncio.get_running_loop()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._tasks[task] -= 1
+                if self._tasks[task] <= 0:
+                    del self._tasks[task]
+
+    def _sampled_threads(self) -> List[int]:
+        with self._lock:
+            threads = list(self._threads)
+            loops = list(self._loops.items())
+            tasks = set(self._tasks)
+        for ident, loop in loops:
+            if tasks and asyncio.current_task(loop) in tasks:
+                threads.append(ident)
+        return threads
+
+    def _run(self) -> None:
+        while self.active:
+            frames = sys._current_frames()
+            for ident in self._sampled_threads():
+                frame = frames.get(ident)
+                stack: List[str] = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                if stack:
+                    with self._lock:
+                        self.samples[tuple(reversed(stack))] += 1
+            time.sleep(self.interval_sec)
+
+    def collapsed(self) -> str:
+        with self._lock:
+            items = self.samples.most_common()
+        return "".join(f"{';'.join(stack)} {count}\n" for stack, count in items)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "active": self.active,
+            "rate": self.rate,
+            "interval_ms": self.interval_sec * 1000,
+            "remaining_sec": max(0.0, self.until - time.monotonic()),
+            "sampled_requests": self.sampled_requests,
+            "samples": sum(self.samples.values()),
+        }
+
+
+PROFILER = SamplingProfiler()
+
+
+def _on_sampled_thread(func: Callable, *args: Any, **kwargs: Any) -> Any:
+    with PROFILER.on_thread():
+        return func(*args, **kwargs)
+
+
+async def run_in_threadpool(func: Callable, *args: Any, **kwargs: Any) -> Any:
+    # Worker threads inherit the request context; register them while they
+    # run work for a sampled request.
+    if _sampled.get():
+        return await _run_in_threadpool(_on_sampled_thread, func, *args, **kwargs)
+    return await _run_in_threadpool(func, *args, **kwargs)
+
+
+def profiled(endpoint: Callable) -> Callable:
+    if getattr(endpoint, "__profiled__", False):
+        return endpoint
+
+    # FastAPI resolves string annotations against the wrapper's globals, so
+    # hand it the endpoint's already-evaluated signature instead.
+    signature = inspect.signature(endpoint, eval_str=True)
+
+    if inspect.iscoroutinefunction(endpoint):
+
+        @functools.wraps(endpoint)
+        async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+            if not PROFILER.should_sample():
+                return await endpoint(*args, **kwargs)
+            with PROFILER.request(), PROFILER.on_task():
+                return await endpoint(*args, **kwargs)
+
+        async_wrapper.__signature__ = signature
+        async_wrapper.__profiled__ = True
+        return async_wrapper
+
+    @functools.wraps(endpoint)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        if not PROFILER.should_sample():
+            return endpoint(*args, **kwargs)
+        with PROFILER.request(), PROFILER.on_thread():
+            return endpoint(*args, **kwargs)
+
+    wrapper.__signature__ = signature
+    wrapper.__profiled__ = True
+    return wrapper
+
+
+class ProfiledRoute(APIRoute):
+    def __init__(self, path: str, endpoint: Callable, **kwargs: Any) -> None:
+        super().__init__(path, profiled(endpoint), **kwargs)
+
+
+def _check_admin_key(x_admin_key: Optional[str]) -> None:
+    if not ADMIN_API_KEY or x_admin_key != ADMIN_API_KEY:
+        raise HTTPException(status_code=403, detail="Unauthorized")
+
+
+class ProfileStartRequest(BaseModel):
+    rate: float = 1.0
+    duration_sec: float = 60.0
+    interval_ms: float = 5.0
+
+
+class TracemallocStartRequest(BaseModel):
+    frames: int = 25
+
+
+_tracemalloc_baseline: Optional[tracemalloc.Snapshot] = None
+
+admin_router = APIRouter(prefix="/admin/profiling")
+
+
+@admin_router.get("")
+def profiling_status(x_admin_key: str = Header(None)):
+    _check_admin_key(x_admin_key)
+    return {**PROFILER.status(), "tracemalloc": tracemalloc.is_tracing()}
+
+
+@admin_router.post("/start")
+def profiling_start(req: ProfileStartRequest, x_admin_key: str = Header(None)):
+    _check_admin_key(x_admin_key)
+    PROFILER.start(
+        rate=req.rate, duration_sec=req.duration_sec, interval_sec=req.interval_ms / 1000
+    )
+    return PROFILER.status()
+
+
+@admin_router.post("/stop")
+def profiling_stop(x_admin_key: str = Header(None)):
+    _check_admin_key(x_admin_key)
+    PROFILER.stop()
+    return PROFILER.status()
+
+
+@admin_router.get("/collapsed", response_class=PlainTextResponse)
+def profiling_collapsed(reset: bool = False, x_admin_key: str = Header(None)):
+    _check_admin_key(x_admin_key)
+    body = PROFILER.collapsed()
+    if reset:
+        PROFILER.reset()
+    return PlainTextResponse(body)
+
+
+@admin_router.post("/tracemalloc/start")
+def tracemalloc_start(req: TracemallocStartRequest, x_admin_key: str = Header(None)):
+    global _tracemalloc_baseline
+    _check_admin_key(x_admin_key)
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(req.frames)
+    _tracemalloc_baseline = tracemalloc.take_snapshot()
+    return {"tracing": True, "frames": tracemalloc.get_traceback_limit()}
+
+
+@admin_router.get("/tracemalloc/snapshot")
+def tracemalloc_snapshot(
+    limit: int = 30,
+    key_type: str = "lineno",
+    compare: bool = True,
+    x_admin_key: str = Header(None),
+):
+    _check_admin_key(x_admin_key)
+    if not tracemalloc.is_tracing():
+        raise HTTPException(status_code=409, detail="tracemalloc is not running")
+    snapshot = tracemalloc.take_snapshot().filter_traces(
+        [tracemalloc.Filter(False, tracemalloc.__file__)]
+    )
+    current, peak = tracemalloc.get_traced_memory()
+    if compare and _tracemalloc_baseline is not None:
+        stats = snapshot.compare_to(_tracemalloc_baseline, key_type)[:limit]
+        top = [
+            {"where": str(s.traceback), "size": s.size, "size_diff": s.size_diff, "count": s.count}
+            for s in stats
+        ]
+    else:
+        top = [
+            {"where": str(s.traceback), "size": s.size, "count": s.count}
+            for s in snapshot.statistics(key_type)[:limit]
+        ]
+    return {"current": current, "peak": peak, "top": top}
+
+
+@admin_router.post("/tracemalloc/stop")
+def tracemalloc_stop(x_admin_key: str = Header(None)):
+    global _tracemalloc_baseline
+    _check_admin_key(x_admin_key)
+    tracemalloc.stop()
+    _tracemalloc_baseline = None
+    return {"tracing": False}
@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+import os
+from datetime import datetime
+from typing import Any, List, Optional
+
+# Builders for the hot PostgREST queries, shared by the services and the
+# EXPLAIN tool so index checks run against exactly what the services issue.
+# Each returns an unexecuted builder and works with sync and async clients.
+
+EXCLUSION_TABLE = os.getenv("EXCLUSION_TABLE", "user_mission_exclusion")
+MISSION_POOL_CONFLICT = "user_id,date"
+
+
+def latest_feature(sb: Any, user_id: str) -> Any:
+    return (
+        sb.table("user_feature_30d")
+        .select("*")
+        .eq("user_id", user_id)
+        .order("snapshot_date", desc=True)
+        .limit(1)
+    )
+
+
+def previous_snapshot(sb: Any, snapshot_date: str) -> Any:
+    return (
+        sb.table("user_feature_30d")
+        .select("snapshot_date")
+        .lt("snapshot_date", snapshot_date)
+        .order("snapshot_date", desc=True)
+        .limit(1)
+    )
+
+
+def keyset_page(
+    sb: Any, table: str, columns: str, *, after: Optional[str], page_size: int, **eq: Any
+) -> Any:
+    q = sb.table(table).select(columns)
+    for column, value in eq.items():
+        q = q.eq(column, value)
+    if after is not None:
+        q = q.gt("user_id", after)
+    return q.order("user_id").limit(page_size)
+
+
+def pool_row(sb: Any, user_id: str, date: str) -> Any:
+    return (
+        sb.table("user_mission_pool")
+        .select("exclude_mission_ids")
+        .eq("user_id", user_id)
+        .eq("date", date)
+        .limit(1)
+    )
+
+
+def pool_rows(sb: Any, user_ids: List[str], dates: List[str]) -> Any:
+    return (
+        sb.table("user_mission_pool")
+        .select("user_id,date,exclude_mission_ids,completed_at")
+        .in_("user_id", user_ids)
+        .in_("date", dates)
+        .order("user_id")
+        .order("date")
+    )
+
+
+def completed_missions(sb: Any, user_ids: List[str], since: datetime) -> Any:
+    return (
+        sb.table("user_mission_pool")
+        .select("user_id,date,exclude_mission_ids,completed_at,status")
+        .in_("user_id", user_ids)
+        .eq("status", "completed")
+        .gte("completed_at", since.isoformat())
+        .order("user_id")
+        .order("date")
+    )
+
+
+def exclusion_summary(sb: Any, user_id: str) -> Any:
+    return sb.table(EXCLUSION_TABLE).select("exclusions").eq("user_id", user_id).limit(1)
+
+
+def exclusion_summaries(sb: Any, user_ids: List[str]) -> Any:
+    return (
+        sb.table(EXCLUSION_TABLE)
+        .select("user_id,exclusions")
+        .in_("user_id", user_ids)
+        .order("user_id")
+    )
@@ -0,0 +1,202 @@
+from __future__ import annotations
+
+import fcntl
+import mmap
+import os
+import struct
+import threading
+import time
+from typing import IO, Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import orjson
+
+# Layout: MAGIC | u64 header length | JSON header | 64-byte aligned column arrays.
+# String columns are stored as integer codes into a per-column string table
+# (u64 offsets + utf-8 blob), so each worker only materialises unique values.
+MAGIC = b"SHMTBL01"
+ALIGN = 64
+
+Row = Dict[str, Any]
+
+
+def _column_kind(values: List[Any]) -> str:
+    present = [v for v in values if v is not None]
+    has_null = len(present) != len(values)
+    if not present:
+        return "str"
+    if all(isinstance(v, bool) for v in present):
+        return "json" if has_null else "b1"
+    if all(isinstance(v, int) and not isinstance(v, bool) for v in present):
+        return "f8" if has_null else "i8"
+    if all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in present):
+        return "f8"
+    if all(isinstance(v, str) for v in present):
+        return "str"
+    return "json"
+
+
+def _codes_dtype(n: int) -> np.dtype:
+    # Smallest signed width that holds every code, leaving -1 for null.
+    if n < 2**7:
+        return np.dtype(np.int8)
+    if n < 2**15:
+        return np.dtype(np.int16)
+    return np.dtype(np.int32)
+
+
+def _string_table(values: List[Any], encode: Callable[[Any], bytes]) -> Dict[str, np.ndarray]:
+    index: Dict[bytes, int] = {}
+    codes = np.empty(len(values), dtype=np.int64)
+    for i, v in enumerate(values):
+        codes[i] = -1 if v is None else index.setdefault(encode(v), len(index))
+    table = list(index)
+    offsets = np.zeros(len(table) + 1, dtype=np.uint64)
+    np.cumsum([len(s) for s in table], out=offsets[1:])
+    return {
+        "codes": codes.astype(_codes_dtype(len(table))),
+        "offsets": offsets,
+        "blob": np.frombuffer(b"".join(table), dtype=np.uint8),
+    }
+
+
+def _encode_columns(rows: List[Row]) -> List[Tuple[str, str, Dict[str, np.ndarray]]]:
+    names: Dict[str, None] = {}
+    for r in rows:
+        names.update(dict.fromkeys(r))
+
+    columns = []
+    for name in names:
+        values = [r.get(name) for r in rows]
+        kind = _column_kind(values)
+        if kind == "str":
+            arrays = _string_table(values, str.encode)
+        elif kind == "json":
+            arrays = _string_table(values, orjson.dumps)
+        elif kind == "f8":
+            arrays = {"data": np.array([np.nan if v is None else v for v in values], np.float64)}
+        else:
+            arrays = {"data": np.array(values, dtype=np.int64 if kind == "i8" else np.bool_)}
+        columns.append((name, kind, arrays))
+    return columns
+
+
+def write_table(path: str, rows: List[Row], *, version: str) -> None:
+    columns = _encode_columns(rows)
+
+    layout = []
+    offset = 0
+    for name, kind, arrays in columns:
+        spec = {}
+        for key, arr in arrays.items():
+            spec[key] = [offset, arr.dtype.str, len(arr)]
+            offset += -(-arr.nbytes // ALIGN) * ALIGN
+        layout.append({"name": name, "kind": kind, "arrays": spec})
+
+    header = orjson.dumps({"version": version, "rows": len(rows), "columns": layout})
+    data_start = -(-(len(MAGIC) + 8 + len(header)) // ALIGN) * ALIGN
+
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(MAGIC + struct.pack("<Q", len(header)) + header)
+        for spec, (_, _, arrays) in zip(layout, columns):
+            for key, arr in arrays.items():
+                f.seek(data_start + spec["arrays"][key][0])
+                f.write(arr.tobytes())
+        f.truncate(data_start + offset)
+    os.replace(tmp, path)
+
+
+class SharedTable:
+    def __init__(self, path: str) -> None:
+        with open(path, "rb") as f:
+            st = os.fstat(f.fileno())
+            self.identity = (st.st_ino, st.st_mtime_ns)
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self._mm[: len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a shared table")
+        (header_len,) = struct.unpack_from("<Q", self._mm, len(MAGIC))
+        header = orjson.loads(self._mm[len(MAGIC) + 8 : len(MAGIC) + 8 + header_len])
+        data_start = -(-(len(MAGIC) + 8 + header_len) // ALIGN) * ALIGN
+
+        self.version: str = header["version"]
+        self.rows: int = header["rows"]
+        self.columns: List[Dict[str, Any]] = header["columns"]
+        self._arrays: Dict[str, Dict[str, np.ndarray]] = {}
+        self._tables: Dict[str, List[Any]] = {}
+        for col in self.columns:
+            self._arrays[col["name"]] = {
+                key: np.frombuffer(
+                    self._mm, dtype=np.dtype(dtype), count=count, offset=data_start + offset
+                )
+                for key, (offset, dtype, count) in col["arrays"].items()
+            }
+
+    def _table(self, col: Dict[str, Any]) -> List[Any]:
+        name = col["name"]
+        table = self._tables.get(name)
+        if table is None:
+            decode = bytes.decode if col["kind"] == "str" else orjson.loads
+            arrays = self._arrays[name]
+            offsets, blob = arrays["offsets"].tolist(), arrays["blob"].tobytes()
+            table = [decode(blob[offsets[i] : offsets[i + 1]]) for i in range(len(offsets) - 1)]
+            self._tables[name] = table
+        return table
+
+    def _values(self, col: Dict[str, Any]) -> List[Any]:
+        arrays = self._arrays[col["name"]]
+        if col["kind"] in ("str", "json"):
+            table = self._table(col)
+            return [None if c < 0 else table[c] for c in arrays["codes"].tolist()]
+        if col["kind"] == "f8":
+            return [None if v != v else v for v in arrays["data"].tolist()]
+        return arrays["data"].tolist()
+
+    def records(self) -> List[Row]:
+        names = [col["name"] for col in self.columns]
+        return [dict(zip(names, values)) for values in zip(*map(self._values, self.columns))]
+
+
+# One file per table, shared by every worker on the host (put it on /dev/shm).
+# Writers replace the file atomically; readers keep serving the mapping they
+# hold until they notice a new inode, and a stale table keeps being served
+# while one caller refreshes it, so neither a swap nor a reload blocks a request.
+class SharedTableStore:
+    def __init__(self, path: str, *, max_age_sec: float) -> None:
+        self.path = path
+        self.max_age_sec = max_age_sec
+        self._current: Optional[SharedTable] = None
+        self._lock = threading.Lock()
+
+    def current(self) -> Optional[SharedTable]:
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        with self._lock:
+            current = self._current
+            if current is None or current.identity != (st.st_ino, st.st_mtime_ns):
+                current = self._current = SharedTable(self.path)
+            return current
+
+    def is_stale(self, table: SharedTable) -> bool:
+        return time.time() - table.identity[1] / 1e9 > self.max_age_sec
+
+    # One publisher per host. The lock is held across the caller's fetch, so
+    # take it from a worker thread but never wait on anything else while
+    # holding it.
+    def acquire(self) -> IO[str]:
+        lock = open(f"{self.path}.lock", "a")
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        return lock
+
+    def release(self, lock: IO[str]) -> None:
+        fcntl.flock(lock, fcntl.LOCK_UN)
+        lock.close()
+
+    def publish(self, rows: List[Row], *, version: str) -> SharedTable:
+        write_table(self.path, rows, version=version)
+        with self._lock:
+            self._current = SharedTable(self.path)
+            return self._current
@@ -0,0 +1,208 @@
+from __future__ import annotations
+
+import logging
+import os
+import queue
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import orjson
+from fastapi import Request, Response
+
+from shared.profiling import ProfiledRoute
+
+logger = logging.getLogger(__name__)
+
+TRACE_EXPORT_PATH = os.getenv("TRACE_EXPORT_PATH")
+TRACE_SLOW_MS = float(os.getenv("TRACE_SLOW_MS", "1000"))
+TRACE_QUEUE_MAX = int(os.getenv("TRACE_QUEUE_MAX", "10000"))
+SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "mycjone-api")
+
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+SPAN_KIND_CLIENT = 3
+
+
+class Span:
+    __slots__ = ("name", "span_id", "kind", "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(self, name: str, *, kind: int, attributes: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.span_id = secrets.token_hex(8)
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.attributes = attributes or {}
+        self.error: Optional[str] = None
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e6
+
+    def to_otlp(self, trace_id: str, parent_span_id: str) -> Dict[str, Any]:
+        span = {
+            "traceId": trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": parent_span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [_otlp_attribute(k, v) for k, v in self.attributes.items()],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+        }
+        if not parent_span_id:
+            del span["parentSpanId"]
+        return span
+
+
+def _otlp_attribute(key: str, value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+def _parse_traceparent(header: Optional[str]) -> tuple:
+    parts = (header or "").split("-")
+    if len(parts) == 4 and len(parts[1]) == 32 and len(parts[2]) == 16:
+        return parts[1], parts[2]
+    return secrets.token_hex(16), ""
+
+
+class Trace:
+    def __init__(self, name: str, *, traceparent: Optional[str] = None) -> None:
+        self.trace_id, self.parent_span_id = _parse_traceparent(traceparent)
+        self.root = Span(name, kind=SPAN_KIND_SERVER)
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def add(self, span: Span) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    def finish(self, *, status_code: Optional[int] = None, error: Optional[str] = None) -> None:
+        self.root.end_ns = time.time_ns()
+        if status_code is not None:
+            self.root.attributes["http.response.status_code"] = status_code
+        self.root.error = error or (f"HTTP {status_code}" if (status_code or 0) >= 500 else None)
+
+    def server_timing(self) -> str:
+        totals: Dict[str, float] = {}
+        with self._lock:
+            for s in self.spans:
+                totals[s.name] = totals.get(s.name, 0.0) + s.duration_ms
+        totals["total"] = self.root.duration_ms
+        return ", ".join(f"{name};dur={ms:.1f}" for name, ms in totals.items())
+
+    def to_otlp(self) -> Dict[str, Any]:
+        with self._lock:
+            spans = [s.to_otlp(self.trace_id, self.root.span_id) for s in self.spans]
+        spans.insert(0, self.root.to_otlp(self.trace_id, self.parent_span_id))
+        return {
+            "resourceSpans": [
+                {
+                    "resource": {"attributes": [_otlp_attribute("service.name", SERVICE_NAME)]},
+                    "scopeSpans": [{"scope": {"name": "shared.tracing"}, "spans": spans}],
+                }
+            ]
+        }
+
+
+_current: ContextVar[Optional[Trace]] = ContextVar("trace", default=None)
+
+
+@contextmanager
+def span(name: str, *, kind: int = SPAN_KIND_INTERNAL, **attributes: Any) -> Iterator[None]:
+    trace = _current.get()
+    if trace is None:
+        yield
+        return
+    s = Span(name, kind=kind, attributes=attributes)
+    try:
+        yield
+    except BaseException as exc:
+        s.error = repr(exc)
+        raise
+    finally:
+        s.end_ns = time.time_ns()
+        trace.add(s)
+
+
+class _Exporter:
+    def __init__(self, path: str, *, maxsize: int) -> None:
+        self.path = path
+        self.dropped = 0
+        self._queue: "queue.Queue[bytes]" = queue.Queue(maxsize=maxsize)
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def submit(self, trace: Trace) -> None:
+        try:
+            self._queue.put_nowait(orjson.dumps(trace.to_otlp()) + b"\n")
+        except queue.Full:
+            # Shed traces rather than memory when the writer falls behind.
+            self.dropped += 1
+            if self.dropped % 1000 == 1:
+                logger.warning("trace export queue full; %d traces dropped", self.dropped)
+
+    def _run(self) -> None:
+        while True:
+            lines = [self._queue.get()]
+            while True:
+                try:
+                    lines.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                with open(self.path, "ab") as f:
+                    f.write(b"".join(lines))
+            except Exception:
+                logger.exception("failed to export %d traces to %s", len(lines), self.path)
+
+
+_exporter = _Exporter(TRACE_EXPORT_PATH, maxsize=TRACE_QUEUE_MAX) if TRACE_EXPORT_PATH else None
+
+
+def _export(trace: Trace) -> None:
+    if _exporter is not None:
+        _exporter.submit(trace)
+    if trace.root.duration_ms >= TRACE_SLOW_MS:
+        logger.warning(
+            "slow request %s trace_id=%s server_timing=%s",
+            trace.root.name,
+            trace.trace_id,
+            trace.server_timing(),
+        )
+
+
+class TracedRoute(ProfiledRoute):
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+        name = f"{','.join(sorted(self.methods or []))} {self.path}"
+
+        async def traced_handler(request: Request) -> Response:
+            trace = Trace(name, traceparent=request.headers.get("traceparent"))
+            token = _current.set(trace)
+            try:
+                response = await handler(request)
+            except Exception as exc:
+                trace.finish(error=repr(exc))
+                _export(trace)
+                raise
+            finally:
+                _current.reset(token)
+
+            trace.finish(status_code=response.status_code)
+            response.headers["Server-Timing"] = trace.server_timing()
+            response.headers["Timing-Allow-Origin"] = "*"
+            _export(trace)
+            return response
+
+        return traced_handler
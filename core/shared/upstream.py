@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import os
+import random
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import requests
+
+from shared.deadline import expired as deadline_expired
+
+POLICIES = ("least_outstanding", "ewma")
+
+
+class Endpoint:
+    def __init__(self, url: str) -> None:
+        self.url = url
+        self.outstanding = 0
+        self.ewma_sec = 0.0
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self.recovered_at = 0.0
+        self.requests = 0
+        self.failures = 0
+
+    def weight(self, now: float, slow_start_sec: float) -> float:
+        if slow_start_sec <= 0 or now >= self.recovered_at + slow_start_sec:
+            return 1.0
+        return max(0.05, (now - self.recovered_at) / slow_start_sec)
+
+    def stats(self, now: float) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "outstanding": self.outstanding,
+            "ewma_ms": round(self.ewma_sec * 1000, 1),
+            "ejected": self.ejected_until > now,
+            "requests": self.requests,
+            "failures": self.failures,
+        }
+
+
+class UpstreamPool:
+    def __init__(
+        self,
+        urls: List[str],
+        *,
+        policy: str = "ewma",
+        eject_after_failures: int = 3,
+        eject_sec: float = 30.0,
+        slow_start_sec: float = 30.0,
+        ewma_alpha: float = 0.3,
+        failure_penalty_sec: float = 1.0,
+    ) -> None:
+        if not urls:
+            raise ValueError("UpstreamPool needs at least one url")
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown upstream policy {policy!r}, expected one of {POLICIES}")
+        self.endpoints = [Endpoint(u) for u in urls]
+        self.policy = policy
+        self.eject_after_failures = eject_after_failures
+        self.eject_sec = eject_sec
+        self.slow_start_sec = slow_start_sec
+        self.ewma_alpha = ewma_alpha
+        self.failure_penalty_sec = failure_penalty_sec
+        self._lock = threading.Lock()
+
+    def _score(self, ep: Endpoint, now: float, default_ewma_sec: float) -> float:
+        load = ep.outstanding + 1
+        if self.policy == "ewma":
+            load *= ep.ewma_sec or default_ewma_sec
+        return load / ep.weight(now, self.slow_start_sec)
+
+    def _acquire(self) -> Endpoint:
+        now = time.monotonic()
+        with self._lock:
+            healthy = [ep for ep in self.endpoints if ep.ejected_until <= now]
+            if not healthy:
+                # Everything is ejected: try whichever comes back first.
+                healthy = [min(self.endpoints, key=lambda ep: ep.ejected_until)]
+            # Endpoints without a latency sample yet are scored as average.
+            known = [ep.ewma_sec for ep in healthy if ep.ewma_sec > 0]
+            default_ewma_sec = sum(known) / len(known) if known else 1.0
+            random.shuffle(healthy)
+            ep = min(healthy, key=lambda ep: self._score(ep, now, default_ewma_sec))
+            ep.outstanding += 1
+            ep.requests += 1
+            return ep
+
+    def _release(self, ep: Endpoint, latency_sec: float, ok: Optional[bool]) -> None:
+        now = time.monotonic()
+        with self._lock:
+            ep.outstanding -= 1
+            if ok is None:
+                return
+            if not ok:
+                # Fast errors must not make a broken replica look attractive.
+                latency_sec = max(latency_sec, self.failure_penalty_sec)
+            if ep.ewma_sec == 0.0:
+                ep.ewma_sec = latency_sec
+            else:
+                ep.ewma_sec += self.ewma_alpha * (latency_sec - ep.ewma_sec)
+            if ok:
+                ep.consecutive_failures = 0
+                return
+            ep.failures += 1
+            ep.consecutive_failures += 1
+            if ep.consecutive_failures >= self.eject_after_failures and len(self.endpoints) > 1:
+                ep.consecutive_failures = 0
+                ep.ejected_until = now + self.eject_sec
+                ep.recovered_at = ep.ejected_until
+                ep.ewma_sec = 0.0
+
+    def post(self, session: requests.Session, **kwargs: Any) -> requests.Response:
+        ep = self._acquire()
+        start = time.monotonic()
+        ok: Optional[bool] = None
+        try:
+            r = session.post(ep.url, **kwargs)
+            ok = r.status_code < 500
+            return r
+        except Exception:
+            ok = False
+            raise
+        finally:
+            # A failure after the caller's own deadline ran out says nothing
+            # about the replica, and neither does a cancelled call.
+            if not ok and deadline_expired():
+                ok = None
+            self._release(ep, time.monotonic() - start, ok)
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        with self._lock:
+            return {"policy": self.policy, "endpoints": [ep.stats(now) for ep in self.endpoints]}
+
+
+def upstream_from_env(prefix: str, urls: str) -> UpstreamPool:
+    return UpstreamPool(
+        [u.strip() for u in urls.split(",") if u.strip()],
+        policy=os.getenv(f"{prefix}_LB_POLICY", "ewma"),
+        eject_after_failures=int(os.getenv(f"{prefix}_EJECT_AFTER_FAILURES", "3")),
+        eject_sec=float(os.getenv(f"{prefix}_EJECT_SEC", "30")),
+        slow_start_sec=float(os.getenv(f"{prefix}_SLOW_START_SEC", "30")),
+    )
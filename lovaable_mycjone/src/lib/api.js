@@ -5,23 +5,75 @@ const MISSION_API_BASE = import.meta.env.VITE_MISSION_API_BASE ?? "http://localh
 const BENEFIT_API_BASE = import.meta.env.VITE_BENEFIT_API_BASE ?? CLUB_API_BASE;
 const API_KEY = import.meta.env.VITE_API_KEY ?? "cHnhXyxjy3iAjuRVy4Nl7XIzulU0eP0L1JnAPTk341U";
 
-async function post(base, path, body) {
+const RETRY_DELAY_MS = 300;
+
+function isRetryable(status) {
+  return status === 429 || status >= 500;
+}
+
+// Retries resend the same body and headers, so an Idempotency-Key created
+// once per user action lets the server collapse them.
+async function post(base, path, body, headers = {}, { retries = 0 } = {}) {
   const url = `${base}${path}`;
-  const res = await fetch(url, {
+  const init = {
     method: "POST",
     headers: {
       "Content-Type": "application/json",
       "x-api-key": API_KEY,
+      ...headers,
     },
     body: JSON.stringify(body),
-  });
+  };
+
+  for (let attempt = 0; ; attempt++) {
+    let res;
+    try {
+      res = await fetch(url, init);
+    } catch (err) {
+      if (attempt >= retries) throw err;
+      await new Promise((resolve) => setTimeout(resolve, RETRY_DELAY_MS * 2 ** attempt));
+      continue;
+    }
+
+    if (res.ok) {
+      return res.json();
+    }
+    if (attempt < retries && isRetryable(res.status)) {
+      await new Promise((resolve) => setTimeout(resolve, RETRY_DELAY_MS * 2 ** attempt));
+      continue;
+    }
+    const text = await res.text();
+    throw new Error(`${url} failed (${res.status}): ${text}`);
+  }
+}
+
+const IDEMPOTENT_RETRIES = 2;
+
+const etagCache = new Map();
 
+async function getCached(base, path, params) {
+  const url = `${base}${path}?${new URLSearchParams(params)}`;
+  const cached = etagCache.get(url);
+  const headers = { "x-api-key": API_KEY };
+  if (cached) {
+    headers["If-None-Match"] = cached.etag;
+  }
+
+  const res = await fetch(url, { headers });
+  if (res.status === 304 && cached) {
+    return cached.body;
+  }
   if (!res.ok) {
     const text = await res.text();
     throw new Error(`${url} failed (${res.status}): ${text}`);
   }
 
-  return res.json();
+  const body = await res.json();
+  const etag = res.headers.get("ETag");
+  if (etag) {
+    etagCache.set(url, { etag, body });
+  }
+  return body;
 }
 
 /* =========================
@@ -29,14 +81,14 @@ async function post(base, path, body) {
 ========================= */
 
 export async function fetchMissions({ userId, k = 3, excludeDays = 7 }) {
-  return post(MISSION_API_BASE, "/missions/recommend", {
+  return getCached(MISSION_API_BASE, "/missions/recommend", {
     user_id: userId,
     k,
     exclude_days: excludeDays,
   });
 }
 
-export async function completeMission({ userId, missionId, dateStr, completedAt }) {
+export async function completeMission({ userId, missionId, dateStr, completedAt, idempotencyKey }) {
   const now = new Date();
   const defaultDateStr = now.toISOString().slice(0, 10);
   const defaultCompletedAt = now.toISOString().replace("T", " ").slice(0, 19);
@@ -46,24 +98,50 @@ export async function completeMission({ userId, missionId, dateStr, completedAt
     date_str: dateStr ?? defaultDateStr,
     completed_mission_ids: [missionId],
     completed_at: completedAt ?? defaultCompletedAt,
-  });
+  }, {
+    "Idempotency-Key": idempotencyKey ?? crypto.randomUUID(),
+  }, { retries: IDEMPOTENT_RETRIES });
 }
 
 /* =========================
    Club APIs
 ========================= */
 
-export async function predictClubs(userId) {
-  return post(CLUB_API_BASE, "/predict", {
-    user_id: userId,
-  });
+export async function predictClubs(userId, { fields, clubDomain, maxOffers } = {}) {
+  const params = { user_id: userId };
+  if (fields) {
+    params.fields = Array.isArray(fields) ? fields.join(",") : fields;
+  }
+  if (clubDomain) {
+    params.club_domain = clubDomain;
+  }
+  if (maxOffers != null) {
+    params.max_offers = maxOffers;
+  }
+  return getCached(CLUB_API_BASE, "/predict", params);
+}
+
+export async function fetchClubOffers(userId, clubDomain, { offset = 0, limit = 20, brandCode } = {}) {
+  const params = new URLSearchParams({ user_id: userId, offset, limit });
+  if (brandCode) {
+    params.set("brand_code", brandCode);
+  }
+  const url = `${CLUB_API_BASE}/clubs/${encodeURIComponent(clubDomain)}/offers?${params}`;
+  const res = await fetch(url, { headers: { "x-api-key": API_KEY } });
+  if (!res.ok) {
+    const text = await res.text();
+    throw new Error(`${url} failed (${res.status}): ${text}`);
+  }
+  return res.json();
 }
 
-export async function selectClub(userId, clubDomain) {
+export async function selectClub(userId, clubDomain, idempotencyKey) {
   return post(CLUB_API_BASE, "/select_club", {
     user_id: userId,
     club_domain: clubDomain,
-  });
+  }, {
+    "Idempotency-Key": idempotencyKey ?? crypto.randomUUID(),
+  }, { retries: IDEMPOTENT_RETRIES });
 }
 
 export async function leaveClub(userId) {
@@ -0,0 +1,36 @@
+-- Tables the benefit and mission services read and write that were created
+-- outside version control. Guarded so the migration is a no-op where they
+-- already exist.
+
+create table if not exists public.user_mission_exclusion (
+  user_id text primary key,
+  exclusions jsonb not null default '{}'::jsonb,
+  updated_at timestamptz not null default now()
+);
+
+create table if not exists public.segment_default_recommendation (
+  id bigint generated always as identity primary key,
+  gender text,
+  age_band text,
+  club_result jsonb,
+  mission_result jsonb,
+  updated_at timestamptz not null default now()
+);
+
+-- A null gender or age_band is the wildcard row; allow one per segment.
+create unique index if not exists segment_default_recommendation_segment_key
+  on public.segment_default_recommendation (coalesce(gender, '*'), coalesce(age_band, '*'));
+
+create table if not exists public.recompute_queue (
+  user_id text not null,
+  snapshot_date date not null,
+  reasons text[] not null default '{}',
+  max_delta double precision,
+  queued_at timestamptz not null default now(),
+  primary key (user_id, snapshot_date)
+);
+
+-- Only the services' service-role key touches these tables.
+alter table public.user_mission_exclusion enable row level security;
+alter table public.segment_default_recommendation enable row level security;
+alter table public.recompute_queue enable row level security;
@@ -0,0 +1,42 @@
+-- Indexes for the queries in core/shared/queries.py. Migrations run in a
+-- transaction, so indexes are built without CONCURRENTLY; on a large
+-- production table create them concurrently by hand first and this
+-- migration becomes a no-op.
+
+-- save_mission_completion and bulk ingest upsert on (user_id, date). Without
+-- a unique key PostgREST cannot resolve the conflict and inserts duplicates.
+do $$
+begin
+  if not exists (
+    select 1
+    from pg_index i
+    where i.indrelid = 'public.user_mission_pool'::regclass
+      and i.indisunique
+      and i.indpred is null
+      and (
+        select array_agg(a.attname::text order by k.ord)
+        from unnest(i.indkey) with ordinality as k(attnum, ord)
+        join pg_attribute a on a.attrelid = i.indrelid and a.attnum = k.attnum
+      ) = array['user_id', 'date']
+  ) then
+    if exists (
+      select 1 from public.user_mission_pool group by user_id, date having count(*) > 1
+    ) then
+      raise exception 'user_mission_pool has duplicate (user_id, date) rows; merge their exclude_mission_ids before applying this migration';
+    end if;
+    alter table public.user_mission_pool
+      add constraint user_mission_pool_user_id_date_key unique (user_id, date);
+  end if;
+end $$;
+
+-- Exclusion rebuilds: user_id in (...) and status = 'completed' and completed_at >= ...
+create index if not exists user_mission_pool_user_status_completed_idx
+  on public.user_mission_pool (user_id, status, completed_at);
+
+-- Latest feature row per user: user_id = ... order by snapshot_date desc limit 1
+create index if not exists user_feature_30d_user_snapshot_idx
+  on public.user_feature_30d (user_id, snapshot_date desc);
+
+-- Recompute: keyset scan of one snapshot by user_id, and the previous snapshot date.
+create index if not exists user_feature_30d_snapshot_user_idx
+  on public.user_feature_30d (snapshot_date, user_id);
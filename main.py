@@ -1,66 +1,48 @@
-import uuid
-from typing import Optional
+import importlib.util
+import sys
+from pathlib import Path
+from types import ModuleType
 
-from fastapi import FastAPI, Header, HTTPException
+from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import ORJSONResponse
 
-from supabase_client import call_predict_api, leave_user_club, save_user_club
+CORE_DIR = Path(__file__).resolve().parent / "core"
+sys.path.insert(0, str(CORE_DIR))
 
-import os
-from dotenv import load_dotenv
+from shared.capture import install_capture
+from shared.clients import supabase_lifespan
+from shared.profiling import admin_router
 
-load_dotenv()
-API_KEY = os.getenv("API_KEY")
 
-app = FastAPI()
+def _load_service(name: str, service_dir: str) -> ModuleType:
+    path = CORE_DIR / service_dir / "main.py"
+    sys.path.insert(0, str(path.parent))
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+benefit_service = _load_service("benefit_service_main", "benefit_service")
+mission_service = _load_service("mission_service_main", "mission_service")
+
+app = FastAPI(default_response_class=ORJSONResponse, lifespan=supabase_lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=False,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "Server-Timing"],
 )
-
-
-def _check_api_key(x_api_key: Optional[str]):
-    if API_KEY and x_api_key != API_KEY:
-        raise HTTPException(status_code=403, detail="Unauthorized")
-
-
-class PredictRequest(BaseModel):
-    user_id: str
-
-
-class SelectClubRequest(BaseModel):
-    user_id: str
-    club_domain: str
-
-
-class LeaveClubRequest(BaseModel):
-    user_id: str
+install_capture(app)
+app.include_router(benefit_service.router)
+app.include_router(mission_service.router)
+app.include_router(admin_router)
 
 
 @app.get("/health")
 def health():
     return {"ok": True}
-
-
-@app.post("/predict")
-def predict_route(req: PredictRequest, x_api_key: str = Header(None)):
-    _check_api_key(x_api_key)
-    return call_predict_api(user_id=req.user_id, segment_id="", uuid_id=str(uuid.uuid4()))
-
-
-@app.post("/select_club")
-def select_club_route(req: SelectClubRequest, x_api_key: str = Header(None)):
-    _check_api_key(x_api_key)
-    save_user_club(req.user_id, req.club_domain)
-    return {"status": "ok"}
-
-
-@app.post("/leave_club")
-def leave_club_route(req: LeaveClubRequest, x_api_key: str = Header(None)):
-    _check_api_key(x_api_key)
-    leave_user_club(req.user_id)
-    return {"status": "ok"}